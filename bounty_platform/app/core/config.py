@@ -9,4 +9,38 @@ class Settings:
     DATABASE_URL: str = os.getenv("DATABASE_URL", "mysql+pymysql://root:root_password_ChangeMe!@db/bounty_db")
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379/0")
 
-settings = Settings()
\ No newline at end of file
+    # 风控：截图近似查重阈值 (64 位 dHash 汉明距离)
+    PHASH_MAX_DISTANCE: int = int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+
+    # 邀请海报：渲染进程数、字体 (含中文的 ttf/ttc 路径)
+    POSTER_WORKERS: int = int(os.getenv("POSTER_WORKERS", "2"))
+    POSTER_FONT: str = os.getenv("POSTER_FONT", "arial.ttf")
+
+    # 验证码预生成池：容量、生产进程检查间隔 (秒)
+    CAPTCHA_POOL_SIZE: int = int(os.getenv("CAPTCHA_POOL_SIZE", "2000"))
+    CAPTCHA_POOL_INTERVAL: float = float(os.getenv("CAPTCHA_POOL_INTERVAL", "1"))
+
+    # 密码哈希：bcrypt 成本 (调高后旧哈希在登录时自动重算)、哈希进程数、排队上限 (超过直接返回繁忙)
+    PASSWORD_BCRYPT_ROUNDS: int = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+    PASSWORD_WORKERS: int = int(os.getenv("PASSWORD_WORKERS", "2"))
+    PASSWORD_MAX_PENDING: int = int(os.getenv("PASSWORD_MAX_PENDING", "32"))
+
+    # 素材批量导入 (ZIP)：写盘线程数、单包图片数 / 解压后总大小上限 (MB)
+    MATERIAL_IMPORT_WORKERS: int = int(os.getenv("MATERIAL_IMPORT_WORKERS", "8"))
+    MATERIAL_IMPORT_MAX_FILES: int = int(os.getenv("MATERIAL_IMPORT_MAX_FILES", "5000"))
+    MATERIAL_IMPORT_MAX_MB: int = int(os.getenv("MATERIAL_IMPORT_MAX_MB", "1024"))
+
+    # 后台任务 (发件箱)：JOBS_EAGER=1 时提交后在当前进程立即执行 (本地调试 / 测试)；消费进程轮询间隔 (秒)
+    JOBS_EAGER: bool = os.getenv("JOBS_EAGER", "0") == "1"
+    JOBS_POLL_INTERVAL: float = float(os.getenv("JOBS_POLL_INTERVAL", "2"))
+
+    # 请求级 SQL 分析：调试环境开关 (分析每个请求)、生产环境抽样比例 (0 ~ 1)、调试响应头 X-SQL-Profile；
+    # 慢请求 (毫秒) / 单请求查询数 / 同一语句重复次数 (N+1) 告警阈值
+    SQL_PROFILE: bool = os.getenv("SQL_PROFILE", "0") == "1"
+    SQL_PROFILE_SAMPLE: float = float(os.getenv("SQL_PROFILE_SAMPLE", "0"))
+    SQL_PROFILE_HEADER: bool = os.getenv("SQL_PROFILE_HEADER", "0") == "1"
+    SQL_SLOW_REQUEST_MS: float = float(os.getenv("SQL_SLOW_REQUEST_MS", "500"))
+    SQL_MAX_QUERIES: int = int(os.getenv("SQL_MAX_QUERIES", "30"))
+    SQL_N_PLUS_ONE: int = int(os.getenv("SQL_N_PLUS_ONE", "5"))
+
+settings = Settings()
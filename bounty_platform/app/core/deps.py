@@ -1,42 +1,81 @@
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
+from jose import JWTError
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from app.core.config import settings
 from app.database import get_db
 from app.models import User
+from app.core.user_cache import UserCache, CachedUser, decode_token
 
 class TokenData(BaseModel):
     username: Optional[str] = None
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-# 1. 基础验证
-async def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无法验证凭证",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_payload(token: str) -> dict:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
+        payload = decode_token(token)
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.username == token_data.username).first()
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+def _token_from_request(request: Request) -> Optional[str]:
+    """依次读取 Authorization 头与 access_token Cookie (H5 页面用 Cookie)"""
+    raw = request.headers.get("Authorization") or request.cookies.get("access_token")
+    if not raw:
+        return None
+    scheme, _, param = raw.partition(" ")
+    return param if scheme.lower() == "bearer" and param else None
+
+# 1. 基础验证 (返回 ORM 对象，需要修改用户数据的接口使用；普通 def 由 FastAPI 放到线程池执行)
+def get_current_user(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+) -> User:
+    payload = _decode_payload(token)
+    if payload.get("uid"):
+        user = db.get(User, payload["uid"])
+    else:
+        user = db.query(User).filter(User.username == payload["sub"]).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
 
+# 1.1 🟢 缓存版本：返回只读快照 (CachedUser)，命中 Token LRU + 用户快照缓存时不查库
+#     只读页面 / 只需要 user.id 的接口一律用这个
+async def get_current_user_cached(token: str = Depends(oauth2_scheme)) -> CachedUser:
+    payload = _decode_payload(token)
+    user = await UserCache.get(user_id=payload.get("uid"), username=payload["sub"])
+    if user is None:
+        raise _credentials_exception()
+    return user
+
+async def get_current_active_user_cached(current_user: CachedUser = Depends(get_current_user_cached)) -> CachedUser:
+    if current_user.is_banned:
+        raise HTTPException(status_code=400, detail="您的账号已被封禁")
+    return current_user
+
+# 1.2 🟢 可选登录：游客返回 None (首页等公开页面)
+async def get_current_user_optional(request: Request) -> Optional[CachedUser]:
+    token = _token_from_request(request)
+    if not token:
+        return None
+    try:
+        payload = _decode_payload(token)
+    except HTTPException:
+        return None
+    return await UserCache.get(user_id=payload.get("uid"), username=payload["sub"])
+
 # 2. 活跃用户验证 (修复 user.py 报错)
 async def get_current_active_user(
     current_user: User = Depends(get_current_user),
@@ -45,10 +84,10 @@ async def get_current_active_user(
         raise HTTPException(status_code=400, detail="您的账号已被封禁")
     return current_user
 
-# 3. 管理员验证 (核心修复点)
+# 3. 管理员验证 (核心修复点，走缓存快照)
 async def get_current_admin(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: CachedUser = Depends(get_current_user_cached),
+) -> CachedUser:
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
@@ -57,7 +96,7 @@ async def get_current_admin(
     return current_user
     
 # 财务专用 (只看钱)
-async def get_current_finance_admin(current_user: User = Depends(get_current_user)):
+async def get_current_finance_admin(current_user: CachedUser = Depends(get_current_user_cached)):
     # 假设 admin 表里加个 role 字段，或者简单粗暴判断
     # 这里我们演示：只要是管理员都能进，但在 router 里做逻辑区分
     # V3 进阶：建议在 User 表增加 role 字段: 'super', 'finance', 'audit'
@@ -68,7 +107,7 @@ async def get_current_finance_admin(current_user: User = Depends(get_current_use
     return current_user
 
 # 审核专用 (只看单)
-async def get_current_audit_admin(current_user: User = Depends(get_current_user)):
+async def get_current_audit_admin(current_user: CachedUser = Depends(get_current_user_cached)):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="需要管理员权限")
     return current_user
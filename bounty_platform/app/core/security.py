@@ -1,19 +1,39 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import jwt
 from passlib.context import CryptContext
 from .config import settings
 
-# 必须显式指定 bcrypt，防止 passlib 自动选择其他不支持的算法
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 统一密码策略：新密码一律 bcrypt；旧版 app/auth.py 留下的 pbkdf2_sha256 仍可校验，登录成功后自动升级
+# min_rounds 与 default_rounds 相同：调高 PASSWORD_BCRYPT_ROUNDS 后，低成本的旧哈希登录时会被重算
+pwd_context = CryptContext(
+    schemes=["bcrypt", "pbkdf2_sha256"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
+
+def _safe(password: str) -> str:
+    # Bcrypt 限制 72 字节，安全截断
+    return password.encode('utf-8')[:72].decode('utf-8', 'ignore')
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return verify_and_update(plain_password, hashed_password)[0]
+
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """校验密码；哈希不符合当前策略时返回新哈希 (调用方写回)"""
+    if not hashed_password:
+        return False, None
+    # 只有 bcrypt 哈希是截断后计算的；pbkdf2 旧哈希按原文校验
+    secret = _safe(plain_password) if hashed_password.startswith("$2") else plain_password
+    if not pwd_context.verify(secret, hashed_password):
+        return False, None
+    if pwd_context.needs_update(hashed_password):
+        return True, get_password_hash(plain_password)
+    return True, None
 
 def get_password_hash(password):
-    # Bcrypt 限制 72 字节，安全截断
-    safe_password = password.encode('utf-8')[:72]
-    return pwd_context.hash(safe_password.decode('utf-8'))
+    return pwd_context.hash(_safe(password))
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -0,0 +1,186 @@
+import json
+import os
+import random
+import re
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from app.core.config import settings
+from app.core.logger import logger
+
+# 语句归一化：去掉字面量、合并 IN / VALUES 里的占位符，同一 "形状" 的语句视为同一条
+_WS = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|%s|:\w+|\?")
+_PARAM_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_ROW_LIST = re.compile(r"\(\?\.\.\.\)(?:\s*,\s*\(\?\.\.\.\))+")
+
+
+def statement_shape(statement: str) -> str:
+    s = _WS.sub(" ", statement).strip()
+    s = _PARAM.sub("?", _NUMBER.sub("?", _STRING.sub("?", s)))
+    s = _PARAM_LIST.sub("?...", s)
+    return _ROW_LIST.sub("(?...)", s)
+
+
+class RequestProfile:
+    """单个请求内的 SQL 统计"""
+    __slots__ = ("method", "path", "route", "started", "queries", "db_ms", "shapes", "shape_ms")
+
+    def __init__(self, method: str, path: str):
+        self.method, self.path, self.route = method, path, None
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.shapes = Counter()
+        self.shape_ms = Counter()
+
+    def record(self, statement: str, ms: float):
+        shape = statement_shape(statement)
+        self.queries += 1
+        self.db_ms += ms
+        self.shapes[shape] += 1
+        self.shape_ms[shape] += ms
+
+    def n_plus_one(self) -> list:
+        """同一形状的 SELECT 重复执行 SQL_N_PLUS_ONE 次以上，基本就是循环里逐条查询"""
+        return [
+            {"sql": shape[:300], "count": n, "ms": round(self.shape_ms[shape], 2)}
+            for shape, n in self.shapes.most_common()
+            if n >= settings.SQL_N_PLUS_ONE and shape[:6].upper() == "SELECT"
+        ]
+
+    def header(self) -> str:
+        return f"queries={self.queries}; db_ms={self.db_ms:.1f}; repeated={len(self.n_plus_one())}"
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("sql_profile", default=None)
+
+
+# ---------- 引擎事件 (同步引擎与异步引擎底层的同步引擎都会触发) ----------
+# 同步接口在线程池里执行、异步驱动在 greenlet 里执行，都会带上请求的 contextvars，因此能归到对应请求
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._sqlprof_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    started = getattr(context, "_sqlprof_started", None)
+    if profile is not None and started is not None:
+        profile.record(statement, (time.perf_counter() - started) * 1000)
+
+
+class SQLProfiler:
+    """
+    请求级 SQL 分析：查询次数、数据库耗时、重复语句 (N+1)
+    - 慢请求 / 查询过多 / 疑似 N+1 的请求记 warning 日志，并写入 Redis 列表 sqlprof:recent (所有 worker 共享，保留最近 RECENT_SIZE 条)
+    - 按路由的汇总 (次数 / 平均与最大查询数 / 数据库耗时) 保存在当前 worker 进程内
+    - 默认关闭：调试环境 SQL_PROFILE=1 分析每个请求，生产环境用 SQL_PROFILE_SAMPLE 抽样
+    - SQL_PROFILE_HEADER=1 (调试环境) 时被分析的响应带 X-SQL-Profile 头
+    """
+    RECENT_KEY = "sqlprof:recent"
+    RECENT_SIZE = 200
+
+    # 进程内汇总 {路由: {...}} 与 Redis 不可用时的兜底列表
+    _routes = {}
+    _recent = deque(maxlen=RECENT_SIZE)
+
+    @staticmethod
+    def current() -> Optional[RequestProfile]:
+        return _current.get()
+
+    @staticmethod
+    def _aggregate(key: str, profile: RequestProfile, repeated: int):
+        r = SQLProfiler._routes.get(key)
+        if r is None:
+            r = SQLProfiler._routes[key] = {"requests": 0, "queries": 0, "max_queries": 0, "db_ms": 0.0, "flagged_n_plus_one": 0}
+        r["requests"] += 1
+        r["queries"] += profile.queries
+        r["max_queries"] = max(r["max_queries"], profile.queries)
+        r["db_ms"] += profile.db_ms
+        r["flagged_n_plus_one"] += bool(repeated)
+
+    @staticmethod
+    async def finish(profile: RequestProfile):
+        if not profile.queries:
+            return
+        from app.database import redis_conn
+        elapsed = (time.perf_counter() - profile.started) * 1000
+        repeated = profile.n_plus_one()
+        key = f"{profile.method} {profile.route or profile.path}"
+        SQLProfiler._aggregate(key, profile, len(repeated))
+
+        slow = elapsed >= settings.SQL_SLOW_REQUEST_MS
+        if not (slow or repeated or profile.queries >= settings.SQL_MAX_QUERIES):
+            return
+        logger.warning(
+            f"SQL profile {key} ({profile.path}): {elapsed:.0f}ms, {profile.queries} queries, db {profile.db_ms:.0f}ms"
+            + "".join(f"\n  x{r['count']} {r['sql']}" for r in repeated)
+        )
+        report = json.dumps({
+            "at": time.strftime("%Y-%m-%d %H:%M:%S"), "pid": os.getpid(), "route": key, "path": profile.path,
+            "ms": round(elapsed, 1), "queries": profile.queries, "db_ms": round(profile.db_ms, 1), "repeated": repeated,
+        }, ensure_ascii=False)
+        try:
+            pipe = redis_conn.pipeline(transaction=False)
+            pipe.lpush(SQLProfiler.RECENT_KEY, report)
+            pipe.ltrim(SQLProfiler.RECENT_KEY, 0, SQLProfiler.RECENT_SIZE - 1)
+            await pipe.execute()
+        except Exception:
+            SQLProfiler._recent.appendleft(report)
+
+    @staticmethod
+    def stats(limit: int = 50, reset: bool = False) -> dict:
+        """最近被标记的请求 (全部 worker) + 当前 worker 按路由汇总 (按平均查询数倒序)；reset=True 时清空"""
+        from app.database import redis_sync
+        try:
+            raw = redis_sync.lrange(SQLProfiler.RECENT_KEY, 0, limit - 1)
+            if reset:
+                redis_sync.delete(SQLProfiler.RECENT_KEY)
+        except Exception:
+            raw = list(SQLProfiler._recent)[:limit]
+        routes = [
+            dict(r, route=k, avg_queries=round(r["queries"] / r["requests"], 1), avg_db_ms=round(r["db_ms"] / r["requests"], 1))
+            for k, r in SQLProfiler._routes.items()
+        ]
+        routes.sort(key=lambda r: r["avg_queries"], reverse=True)
+        if reset:
+            SQLProfiler._routes.clear()
+            SQLProfiler._recent.clear()
+        return {"pid": os.getpid(), "recent": [json.loads(x) for x in raw], "routes": routes[:limit]}
+
+
+class SQLProfilerMiddleware:
+    """纯 ASGI 中间件：为每个 HTTP 请求建立 RequestProfile，响应头写入前汇总"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # 未开启时只按 SQL_PROFILE_SAMPLE 抽样，其余请求的语句不做归一化，没有额外开销
+        if scope["type"] != "http" or not (settings.SQL_PROFILE or random.random() < settings.SQL_PROFILE_SAMPLE):
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = _current.set(profile)
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start" and settings.SQL_PROFILE_HEADER:
+                MutableHeaders(scope=message).append("X-SQL-Profile", profile.header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")  # FastAPI 匹配成功后写入，按路由模板汇总 (/h5/task/{task_id})
+            profile.route = getattr(route, "path", None)
+            await SQLProfiler.finish(profile)
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+from jose import jwt
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.logger import logger
+from app.database import redis_conn, redis_sync, AsyncSessionLocal, on_commit
+from app.models import User
+
+# 快照字段 (不含密码等敏感信息)
+SNAPSHOT_FIELDS = [
+    "id", "username", "avatar", "balance", "credit_score", "is_admin", "is_banned",
+    "tags", "medals", "inviter_id", "vip_end_time", "created_at", "alipay_name", "alipay_account",
+]
+DATETIME_FIELDS = ("vip_end_time", "created_at")
+
+
+class CachedUser:
+    """当前登录用户的只读快照；需要修改用户数据的接口请按 id 重新加载 ORM 对象"""
+    def __init__(self, data: dict):
+        self.__dict__.update(data)
+
+    def __repr__(self):
+        return f"<CachedUser {self.id} {self.username}>"
+
+
+# ---------- 第一层：Token 解码 LRU ----------
+@lru_cache(maxsize=8192)
+def _decode(token: str) -> dict:
+    return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+def decode_token(token: str) -> dict:
+    """验签结果按 token 缓存；命中后仍校验过期时间"""
+    payload = _decode(token)
+    exp = payload.get("exp")
+    if exp is not None and exp < time.time():
+        raise jwt.ExpiredSignatureError("Signature has expired.")
+    return payload
+
+
+# ---------- 第二层：用户快照 (进程内 + Redis) ----------
+class UserCache:
+    """
+    用户快照缓存，按 user id 存储
+    - 进程内：极短 TTL，吸收同一 worker 的突发请求
+    - Redis：短 TTL，worker 之间共享
+    - 封禁、管理员标记、余额、标签等变更通过 mark_dirty 登记，事务提交后统一失效；
+      失效时 PUBLISH 到 usercache:invalidate，各 worker 的 listen 收到后清掉进程内副本，封禁立即对所有 worker 生效
+    """
+    LOCAL_TTL = 3
+    LOCAL_MAX = 10000
+    REDIS_TTL = 60
+    CHANNEL = "usercache:invalidate"
+
+    _local = OrderedDict()         # user_id -> (过期时间, 快照 dict)
+    _lock = threading.Lock()
+    _username_ids = OrderedDict()  # 旧 token 只有用户名时，用户名 -> id (LRU，上限 LOCAL_MAX)
+
+    @staticmethod
+    def redis_key(user_id: int) -> str:
+        return f"user_snap:{user_id}"
+
+    @staticmethod
+    def to_snapshot(user: User) -> dict:
+        return {f: getattr(user, f) for f in SNAPSHOT_FIELDS}
+
+    @staticmethod
+    def _dumps(data: dict) -> str:
+        return json.dumps({k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in data.items()}, ensure_ascii=False)
+
+    @staticmethod
+    def _loads(raw: str) -> dict:
+        data = json.loads(raw)
+        for f in DATETIME_FIELDS:
+            if data.get(f):
+                data[f] = datetime.fromisoformat(data[f])
+        return data
+
+    # ---------- 进程内 ----------
+    @staticmethod
+    def _local_get(user_id: int) -> Optional[dict]:
+        with UserCache._lock:
+            item = UserCache._local.get(user_id)
+            if not item:
+                return None
+            if item[0] < time.monotonic():
+                UserCache._local.pop(user_id, None)
+                return None
+            UserCache._local.move_to_end(user_id)
+            return item[1]
+
+    @staticmethod
+    def _local_set(user_id: int, data: dict):
+        with UserCache._lock:
+            UserCache._local[user_id] = (time.monotonic() + UserCache.LOCAL_TTL, data)
+            UserCache._local.move_to_end(user_id)
+            while len(UserCache._local) > UserCache.LOCAL_MAX:
+                UserCache._local.popitem(last=False)
+
+    @staticmethod
+    def _remember_username(username: str, user_id: int):
+        with UserCache._lock:
+            UserCache._username_ids[username] = user_id
+            UserCache._username_ids.move_to_end(username)
+            while len(UserCache._username_ids) > UserCache.LOCAL_MAX:
+                UserCache._username_ids.popitem(last=False)
+
+    # ---------- 读取 ----------
+    @staticmethod
+    async def get(user_id: Optional[int] = None, username: Optional[str] = None) -> Optional[CachedUser]:
+        if user_id is None and username:
+            user_id = UserCache._username_ids.get(username)
+
+        if user_id is not None:
+            data = UserCache._local_get(user_id)
+            if data is not None:
+                return CachedUser(data)
+            try:
+                raw = await redis_conn.get(UserCache.redis_key(user_id))
+                if raw:
+                    data = UserCache._loads(raw)
+                    UserCache._local_set(user_id, data)
+                    return CachedUser(data)
+            except Exception as e:
+                logger.warning(f"User cache redis read failed: {e}")
+
+        # 未命中：查库并回填
+        async with AsyncSessionLocal() as db:
+            stmt = select(User).where(User.id == user_id) if user_id is not None else select(User).where(User.username == username)
+            user = (await db.execute(stmt)).scalars().first()
+        if user is None:
+            return None
+        data = UserCache.to_snapshot(user)
+        UserCache._remember_username(user.username, user.id)
+        UserCache._local_set(user.id, data)
+        try:
+            await redis_conn.set(UserCache.redis_key(user.id), UserCache._dumps(data), ex=UserCache.REDIS_TTL)
+        except Exception as e:
+            logger.warning(f"User cache redis write failed: {e}")
+        return CachedUser(data)
+
+    # ---------- 失效 ----------
+    @staticmethod
+    def _drop_local(user_id: int):
+        with UserCache._lock:
+            UserCache._local.pop(user_id, None)
+
+    @staticmethod
+    def invalidate(user_id: int):
+        UserCache.invalidate_many([user_id])
+
+    @staticmethod
+    def invalidate_many(user_ids):
+        try:
+            pipe = redis_sync.pipeline(transaction=False)
+            for user_id in user_ids:
+                UserCache._drop_local(user_id)
+                pipe.delete(UserCache.redis_key(user_id))
+                pipe.publish(UserCache.CHANNEL, user_id)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"User cache invalidate failed: {e}")
+
+    @staticmethod
+    async def listen():
+        """每个 worker 一个后台协程：收到失效通知时清掉进程内快照，断线后 1 秒重连"""
+        while True:
+            pubsub = redis_conn.pubsub()
+            try:
+                await pubsub.subscribe(UserCache.CHANNEL)
+                # 断线期间可能错过通知，(重新) 订阅成功后先清空
+                with UserCache._lock:
+                    UserCache._local.clear()
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        UserCache._drop_local(int(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"User cache subscriber disconnected: {e}")
+            finally:
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+            await asyncio.sleep(1)
+
+    @staticmethod
+    def mark_dirty(db, user_id: int):
+        """登记需要失效的用户，在该 Session 提交成功后统一失效 (同步 / 异步 Session 均可，回滚时丢弃)"""
+        session = getattr(db, "sync_session", db)
+        ids = session.info.get("dirty_user_ids")
+        if ids is None:
+            ids = session.info["dirty_user_ids"] = set()
+            on_commit(db, lambda: UserCache.invalidate_many(ids))
+        ids.add(user_id)
+
+
+# 每个事务一组：提交 / 回滚后下一个事务重新登记
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _reset_dirty_users(session):
+    session.info.pop("dirty_user_ids", None)
@@ -1,6 +1,9 @@
+import asyncio
 import redis.asyncio as redis
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from redis import Redis as SyncRedis
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from .core.config import settings
 
 # 1. MySQL 配置 (同步，用于业务逻辑)
@@ -14,6 +17,20 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# 1.1 MySQL 异步引擎 (H5 高频接口使用，不占线程池、不阻塞事件循环)
+def _async_url(url: str) -> str:
+    for sync_driver, async_driver in (("mysql+pymysql://", "mysql+aiomysql://"), ("sqlite://", "sqlite+aiosqlite://")):
+        if url.startswith(sync_driver):
+            return async_driver + url[len(sync_driver):]
+    return url
+
+_ASYNC_URL = _async_url(settings.DATABASE_URL)
+# aiosqlite 使用 NullPool，不接受连接池大小参数
+_async_pool_args = {} if _ASYNC_URL.startswith("sqlite") else dict(pool_size=20, max_overflow=30, pool_recycle=3600)
+async_engine = create_async_engine(_ASYNC_URL, pool_pre_ping=True, **_async_pool_args)
+# expire_on_commit=False：提交后模板仍可直接读取对象属性，避免异步环境下触发隐式懒加载
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # 2. Redis 配置 (异步，用于限流和缓存)
 redis_conn = redis.from_url(
     settings.REDIS_URL,
@@ -22,9 +39,59 @@ redis_conn = redis.from_url(
     socket_connect_timeout=5
 )
 
+# 3. Redis 同步客户端 (同步路由中的缓存读写使用，避免在线程里跑事件循环)
+redis_sync = SyncRedis.from_url(
+    settings.REDIS_URL,
+    encoding="utf-8",
+    decode_responses=True,
+    socket_connect_timeout=5
+)
+
+# 4. 事务提交后回调 (缓存 / 排行榜等 Redis 写入必须在数据库提交成功后执行)
+def on_commit(db, fn):
+    """登记提交后回调，同步 / 异步 Session 均可；回滚时丢弃"""
+    session = getattr(db, "sync_session", db)
+    session.info.setdefault("after_commit_hooks", []).append(fn)
+
+def _call_hooks(hooks):
+    for fn in hooks:
+        try:
+            fn()
+        except Exception as e:
+            from .core.logger import logger
+            logger.warning(f"after_commit hook failed: {e}")
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit_hooks(session):
+    hooks = session.info.pop("after_commit_hooks", None)
+    if not hooks:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _call_hooks(hooks)  # 同步接口 (线程池) / Celery / 脚本：直接执行
+        return
+    # 事件循环线程里提交 (异步 Session)：回调是阻塞的同步 Redis 调用，交给线程池，commit_async 等待其完成
+    session.info["pending_hooks"] = loop.run_in_executor(None, _call_hooks, hooks)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_after_commit_hooks(session):
+    session.info.pop("after_commit_hooks", None)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def commit_async(db: AsyncSession):
+    """异步 Session 提交，并等待提交后回调在线程池里执行完 (返回前缓存 / 计数已更新，且不阻塞事件循环)"""
+    await db.commit()
+    pending = db.sync_session.info.pop("pending_hooks", None)
+    if pending is not None:
+        await pending
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
@@ -8,6 +9,11 @@ from starlette.middleware.sessions import SessionMiddleware
 from .database import engine, Base, redis_conn
 from .core.config import settings
 from .core.logger import logger  # 🟢 引入日志
+from .core.sql_profiler import SQLProfilerMiddleware
+from .core.user_cache import UserCache
+from .services.poster_service import PosterService
+from .services.password_service import PasswordService
+from .services.ref_data import RefData
 from .routers import auth, user, admin, material, h5, common
 
 # 1. 确保上传目录存在
@@ -21,6 +27,7 @@ app = FastAPI(title="红白悬赏 V3 Enterprise")
 
 # 4. 中间件
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
+app.add_middleware(SQLProfilerMiddleware)  # 🟢 请求级 SQL 次数 / 耗时 / N+1 统计
 
 # 5. 静态资源挂载
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
@@ -51,4 +58,13 @@ async def startup():
         await FastAPILimiter.init(redis_conn)
         logger.info("✅ Redis Connected & Limiter Initialized")
     except Exception as e:
-        logger.error(f"❌ Redis Connection Failed: {e}")
\ No newline at end of file
+        logger.error(f"❌ Redis Connection Failed: {e}")
+    # 🟢 订阅参考数据 / 用户快照失效通知 (断线自动重连)
+    app.state.listeners = [asyncio.create_task(RefData.listen()), asyncio.create_task(UserCache.listen())]
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in app.state.listeners:
+        task.cancel()
+    PosterService.shutdown()
+    PasswordService.shutdown()
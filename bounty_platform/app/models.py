@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -36,9 +36,14 @@ class Material(Base):
     # V3: 支持多图与回收站
     images = Column(JSON)  # 存储 ["/path/1.jpg", "/path/2.jpg"]
     status = Column(String(20), default="unused") 
+    used_by_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    used_at = Column(DateTime, nullable=True)
     is_deleted = Column(Boolean, default=False)   # 软删除
     deleted_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=func.now())
+    content_hash = Column(String(32), index=True)  # 🟢 图片内容指纹 (单图即图片 MD5)，批量导入按它去重
+    # 分类浏览按 id 倒序游标分页
+    __table_args__ = (Index("ix_materials_cat_del_id", "category_id", "is_deleted", "id"),)
 
 class MaterialCategory(Base):
     __tablename__ = "material_categories"
@@ -53,10 +58,11 @@ class Submission(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     task_id = Column(Integer, ForeignKey("tasks.id"))
+    assigned_material_id = Column(Integer, ForeignKey("materials.id"), nullable=True)  # 抢单时分配的素材
     status = Column(String(20), default="pending") # pending, approved, rejected, appealing
     
     screenshot_path = Column(String(255))
-    image_hash = Column(String(64))       # V3: MD5指纹
+    image_hash = Column(String(64), index=True)  # V3: MD5指纹
     
     admin_feedback = Column(String(255))
     appeal_reason = Column(String(255))   # V3: 申诉理由
@@ -160,4 +166,111 @@ class Notification(Base):
     content = Column(Text)
     type = Column(String(20))
     is_read = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime, default=func.now())
+    # 🟢 收件箱按 (user_id, id) 游标分页 / 批量标记已读
+    __table_args__ = (Index("ix_notifications_user_id", "user_id", "id"),)
+
+# 🟢 群发通知：一次群发一行，由 Celery 按用户 id 分块写入 notifications，last_user_id 是断点
+class Broadcast(Base):
+    __tablename__ = "broadcasts"
+    id = Column(Integer, primary_key=True)
+    title = Column(String(100))
+    content = Column(Text)
+    type = Column(String(20), default="system")
+    segment = Column(String(20))          # all / tag / vip / inviter
+    segment_value = Column(String(100))   # 标签名 / 邀请人 ID
+    status = Column(String(20), default="pending")  # pending, sending, done
+    sent_count = Column(Integer, default=0)
+    last_user_id = Column(Integer, default=0)
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+# 🟢 发件箱：提交后的副作用 (提成 / 勋章 / 截图查重 / 海报) 与业务数据同一事务写入，由 JobQueue 消费
+class OutboxJob(Base):
+    __tablename__ = "outbox_jobs"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50))
+    payload = Column(JSON)
+    status = Column(String(20), default="pending")  # pending, done, dead (重试耗尽)
+    attempts = Column(Integer, default=0)
+    next_run_at = Column(DateTime, default=func.now())
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    done_at = Column(DateTime, nullable=True)
+    __table_args__ = (Index("ix_outbox_jobs_status_next", "status", "next_run_at"),)
+
+# 🟢 定向投放倒排索引：任务标签 / 用户标签 (由 TagIndexService 与 JSON 字段同步维护)
+class TaskTag(Base):
+    __tablename__ = "task_tags"
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey("tasks.id"), index=True)
+    tag = Column(String(50))          # 无门槛任务使用通配标签 "*"
+    category = Column(String(50))     # 冗余任务分类，按分类查可见任务时走联合索引
+    __table_args__ = (Index("ix_task_tags_tag_cat_task", "tag", "category", "task_id"),)
+
+class UserTag(Base):
+    __tablename__ = "user_tags"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    tag = Column(String(50))
+    __table_args__ = (
+        Index("ix_user_tags_user_tag", "user_id", "tag", unique=True),
+        Index("ix_user_tags_tag_user", "tag", "user_id"),  # 按标签群发
+    )
+
+# 🟢 素材搜索倒排索引：标题 + 正文切成 中文二元组 / 英文数字单词，只保存未删除的素材
+class MaterialTerm(Base):
+    __tablename__ = "material_terms"
+    id = Column(Integer, primary_key=True)
+    term = Column(String(32))
+    category_id = Column(Integer)     # 冗余素材分类，按分类搜索时走联合索引
+    material_id = Column(Integer, ForeignKey("materials.id"))
+    __table_args__ = (
+        Index("ix_material_terms_term_cat_mat", "term", "category_id", "material_id"),
+        Index("ix_material_terms_mat", "material_id"),
+    )
+
+# 🟢 统一资金流水 (只追加不修改)，所有余额变动必须通过 LedgerService 写入
+class LedgerEntry(Base):
+    __tablename__ = "ledger_entries"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    type = Column(String(20))          # income, expense, refund
+    biz_type = Column(String(30))      # task_reward, commission, checkin, deposit, withdraw, withdraw_refund, buy_vip, admin_adjust
+    title = Column(String(100))
+    amount = Column(Float)             # 带符号：收入为正，支出为负
+    balance_after = Column(Float)
+    ref_id = Column(Integer, nullable=True)  # 关联业务单号 (submission / deposit / withdrawal / vip_plan)
+    created_at = Column(DateTime, default=func.now())
+    __table_args__ = (Index("ix_ledger_user_id", "user_id", "id"),)
+
+# 🟢 截图感知哈希指纹 (只追加)，PHashIndex 按主键水位线增量加载到内存
+class ImageFingerprint(Base):
+    __tablename__ = "image_fingerprints"
+    id = Column(Integer, primary_key=True)
+    submission_id = Column(Integer, ForeignKey("submissions.id"), index=True)
+    phash = Column(String(16))  # 64 位 dHash 的十六进制
+    created_at = Column(DateTime, default=func.now())
+
+# 🟢 用户成就计数 (反范式)，勋章规则直接按计数判定，审核时不再 COUNT 提交表
+class UserStats(Base):
+    __tablename__ = "user_stats"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    approved_count = Column(Integer, default=0)     # 审核通过的任务数
+    lifetime_earnings = Column(Float, default=0.0)  # 累计收入 (任务奖励 + 提成 + 签到)
+    checkin_streak = Column(Integer, default=0)     # 当前连续签到天数
+    last_checkin_date = Column(String(20), nullable=True)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+# 🟢 看板按日汇总 (定时任务写入)
+class DailyStat(Base):
+    __tablename__ = "daily_stats"
+    date = Column(String(10), primary_key=True)  # 2026-01-01
+    new_users = Column(Integer, default=0)
+    submissions = Column(Integer, default=0)
+    approved = Column(Integer, default=0)
+    payout = Column(Float, default=0.0)          # 当日发放的任务奖励 + 提成
+    deposit = Column(Float, default=0.0)
+    withdraw = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -1,12 +1,16 @@
 from fastapi import APIRouter, Depends, Response, Request, Form
 from fastapi.responses import RedirectResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_limiter.depends import RateLimiter # 🟢 引入限流
 
-from ..database import get_db
+from ..database import get_async_db, commit_async
 from ..core import security, logger
 from .. import models
+from ..services.stats_service import StatsService
+from ..services.password_service import PasswordService, PasswordBusy
+from ..services.jobs import JobQueue
 
 router = APIRouter(tags=["Auth"])
 templates = Jinja2Templates(directory="app/templates")
@@ -16,15 +20,22 @@ def login_page(request: Request):
     return templates.TemplateResponse("login.html", {"request": request, "user": None})
 
 # 🟢 登录限流：每分钟最多试错 10 次
+# 🟢 密码校验在哈希进程池中执行；排队满时直接返回繁忙，不占用其它接口的资源
 @router.post("/login", dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-def login(
+async def login(
     request: Request, 
     username: str = Form(...), 
     password: str = Form(...), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user or not security.verify_password(password, user.hashed_password):
+    user = (await db.execute(select(models.User).where(models.User.username == username))).scalars().first()
+    try:
+        ok, new_hash = await PasswordService.verify(password, user.hashed_password if user else None)
+    except PasswordBusy:
+        return templates.TemplateResponse("login.html", {
+            "request": request, "error": "登录人数过多，请稍后再试", "user": None
+        }, status_code=503)
+    if not ok:
         return templates.TemplateResponse("login.html", {
             "request": request, "error": "账号或密码错误", "user": None
         })
@@ -34,7 +45,12 @@ def login(
             "request": request, "error": "账号被封禁", "user": None
         })
 
-    token = security.create_access_token({"sub": user.username})
+    # 密码策略升级 (算法 / 成本变化) 后透明重算
+    if new_hash:
+        user.hashed_password = new_hash
+        await commit_async(db)
+
+    token = security.create_access_token({"sub": user.username, "uid": user.id})
     target_url = "/admin/dashboard" if user.is_admin else "/h5/index"
     resp = RedirectResponse(url=target_url, status_code=302)
     resp.set_cookie(key="access_token", value=f"Bearer {token}", httponly=True)
@@ -46,13 +62,13 @@ def register_page(request: Request, invite: str = ""):
 
 # 🟢 注册限流：每分钟最多 5 次 (防脚本批量注册)
 @router.post("/register", dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-def register(
+async def register(
     request: Request,
     username: str = Form(...),
     password: str = Form(...), 
     captcha: str = Form(...),
     invite_code: str = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     session_captcha = request.session.get("captcha")
     if not session_captcha or str(session_captcha).lower() != captcha.lower():
@@ -60,28 +76,38 @@ def register(
             "request": request, "error": "验证码错误", "invite_code": invite_code, "user": None
         })
     
-    if db.query(models.User).filter(models.User.username == username).first():
+    if (await db.execute(select(models.User.id).where(models.User.username == username))).first():
         return templates.TemplateResponse("register.html", {
             "request": request, "error": "用户名已存在", "invite_code": invite_code, "user": None
         })
 
-    hashed_pwd = security.get_password_hash(password)
+    try:
+        hashed_pwd = await PasswordService.hash(password)
+    except PasswordBusy:
+        return templates.TemplateResponse("register.html", {
+            "request": request, "error": "注册人数过多，请稍后再试", "invite_code": invite_code, "user": None
+        }, status_code=503)
 
     inviter_id = None
     if invite_code and invite_code.isdigit():
-        inviter = db.query(models.User).filter(models.User.id == int(invite_code)).first()
+        inviter = await db.get(models.User, int(invite_code))
         if inviter: inviter_id = inviter.id
 
     new_user = models.User(username=username, hashed_password=hashed_pwd, inviter_id=inviter_id)
     
     try:
         db.add(new_user)
-        db.commit()
+        StatsService.incr(db, "users")
+        StatsService.incr_daily(db, "new_users")
+        await db.flush()
+        # 🟢 邀请海报提交后在后台预渲染，第一次打开邀请页直接命中缓存
+        JobQueue.enqueue(db, "render_poster", {"user_id": new_user.id, "username": username, "base_url": str(request.base_url).rstrip("/")})
+        await commit_async(db)
         request.session.pop("captcha", None)
         logger.logger.info(f"New user registered: {username}") # 记录日志
         return templates.TemplateResponse("register.html", {"request": request, "success": True, "user": None})
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.logger.error(f"Register failed: {e}")
         return templates.TemplateResponse("register.html", {
             "request": request, "error": "注册失败，请联系管理员", "invite_code": invite_code, "user": None
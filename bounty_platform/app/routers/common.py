@@ -1,15 +1,14 @@
 from fastapi import APIRouter, Response, Request
-from captcha.image import ImageCaptcha
-import random, string
+from ..services.captcha_pool import CaptchaPool
 
 router = APIRouter(tags=["Common"])
 
 @router.get("/captcha")
 async def get_captcha(request: Request):
-    image = ImageCaptcha(width=120, height=50) 
-    code = "".join(random.choices(string.digits, k=4))
+    # 🟢 从预生成池弹出一张，池子空了才在线程池里现画，不阻塞事件循环
+    code, png = await CaptchaPool.pop()
     
     # 存入 Session，5分钟有效期由 Session 中间件管理
     request.session["captcha"] = code
     
-    return Response(content=image.generate(code).getvalue(), media_type="image/png")
\ No newline at end of file
+    return Response(content=png, media_type="image/png")
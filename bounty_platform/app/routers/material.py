@@ -1,35 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+import asyncio
 import json
+import zipfile
 
-from app.database import get_db
+from app.database import get_db, get_async_db, redis_conn
 from app.models import Material, MaterialCategory, User
 from app.core import deps
-from app.services.risk_control import save_upload_file_sync
+from app.services.risk_control import save_upload_file_with_hash
+from app.services.material_pool import MaterialPool
+from app.services.material_search import MaterialSearchService
+from app.services.material_service import MaterialEntry, MaterialService
 
 router = APIRouter(prefix="/admin/materials", tags=["Material"])
 
-# 1. 素材列表 (🟢 新增 keyword 搜索)
+# 1. 素材列表 (🟢 倒排索引搜索 + 游标分页，cursor 为上一页返回的 next_cursor)
 @router.get("/list/{cat_id}")
 async def list_materials(
     cat_id: int, 
-    keyword: str = Query(None), # 🟢 支持搜索
-    db: Session = Depends(get_db), 
+    keyword: str = Query(None), # 🟢 支持搜索 (标题 + 正文)
+    cursor: Optional[int] = Query(None),
+    limit: int = Query(40, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db), 
     current_user: User = Depends(deps.get_current_admin)
 ):
-    query = db.query(Material).filter(Material.is_deleted == False)
-    
-    if cat_id > 0:
-        query = query.filter(Material.category_id == cat_id)
-        
-    if keyword:
-        query = query.filter(Material.title.contains(keyword))
-        
-    mats = query.order_by(Material.created_at.desc()).all()
+    page = await MaterialSearchService.page(db, cat_id, keyword, cursor, limit)
     
     res = []
-    for m in mats:
+    for m in page["items"]:
         # 解析 JSON 图片列表
         imgs = m.images
         if isinstance(imgs, str):
@@ -45,9 +46,10 @@ async def list_materials(
             "images": imgs, 
             "created_at": m.created_at.strftime("%Y-%m-%d") if m.created_at else ""
         })
-    return res
+    page["items"] = res
+    return page
 
-# 2. 上传素材 (保持不变)
+# 2. 上传素材 (🟢 并发写盘 + 按内容哈希去重 + 批量入库)
 @router.post("/upload")
 async def upload_material(
     cat_id: int = Form(...),
@@ -58,32 +60,51 @@ async def upload_material(
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_admin)
 ):
-    image_paths = []
-    for file in files:
-        path = save_upload_file_sync(file)
-        if path: image_paths.append(path)
+    # 🟢 写盘 + 哈希放到线程池并发执行，避免阻塞事件循环
+    saved = await asyncio.gather(*[run_in_threadpool(save_upload_file_with_hash, file) for file in files])
+    saved = [(path, md5) for path, md5 in saved if path]
             
-    if not image_paths: return {"code": 400, "message": "未上传图片"}
-
-    # 获取分类用于统计
-    cat = db.query(MaterialCategory).filter(MaterialCategory.id == cat_id).first()
+    if not saved: return {"code": 400, "message": "未上传图片"}
 
     if is_carousel:
         # 多图合一
-        new_mat = Material(category_id=cat_id, title=title, content=content, images=image_paths, status="unused")
-        db.add(new_mat)
-        if cat: cat.total_count += 1
+        entries = [MaterialEntry(title, content, [p for p, _ in saved], [m for _, m in saved])]
     else:
         # 拆分上传
-        for img_path in image_paths:
-            new_mat = Material(category_id=cat_id, title=title, content=content, images=[img_path], status="unused")
-            db.add(new_mat)
-        if cat: cat.total_count += len(image_paths)
+        entries = [MaterialEntry(title, content, [p], [m]) for p, m in saved]
+    # 🟢 同步 Session 的入库 + 提交放到线程池，不阻塞事件循环
+    def create():
+        result = MaterialService.create_many(db, cat_id, entries)
+        db.commit()
+        return result
+    new_ids, duplicates = await run_in_threadpool(create)
+    # 🟢 新素材补充进库存池
+    await MaterialPool.push(cat_id, new_ids)
+    return {"code": 200, "message": f"上传成功，跳过重复 {duplicates} 条" if duplicates else "上传成功"}
 
+# 2.1 🟢 ZIP 批量导入：图片包 + CSV 清单 (file,title,content；file 多图用 | 分隔)
+@router.post("/import")
+async def import_materials(
+    cat_id: int = Form(...),
+    archive: UploadFile = File(...),
+    manifest: Optional[UploadFile] = File(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_admin)
+):
+    if not db.query(MaterialCategory.id).filter(MaterialCategory.id == cat_id).first():
+        return {"code": 404, "message": "分类不存在"}
+    manifest_data = await manifest.read() if manifest and manifest.filename else None
+    try:
+        result = await run_in_threadpool(MaterialService.import_archive, db, cat_id, archive.file, manifest_data)
+    except (ValueError, zipfile.BadZipFile) as e:
+        db.rollback()
+        return {"code": 400, "message": f"导入失败: {e}"}
     db.commit()
-    return {"code": 200, "message": "上传成功"}
+    new_ids = result.pop("ids")
+    await MaterialPool.push(cat_id, new_ids)
+    return {"code": 200, "message": f"成功导入 {result['created']} 条，跳过重复 {result['duplicates']} 条", "data": result}
 
-# 3. 🟢 新增：批量操作 (删除/移动)
+# 3. 🟢 新增：批量操作 (删除/移动)，分类计数按分类分组批量调整
 @router.post("/batch")
 async def batch_operate_materials(
     action: str = Form(...), # 'delete' or 'move'
@@ -99,33 +120,31 @@ async def batch_operate_materials(
         
     if not ids: return {"code": 400, "message": "未选择素材"}
 
-    mats = db.query(Material).filter(Material.id.in_(ids)).all()
-    
-    if action == "delete":
-        for m in mats:
-            m.is_deleted = True
-            # 减少计数
-            cat = db.query(MaterialCategory).filter(MaterialCategory.id == m.category_id).first()
-            if cat and cat.total_count > 0: cat.total_count -= 1
-    
-    elif action == "move":
-        if not target_cat_id: return {"code": 400, "message": "请选择目标分类"}
-        target_cat = db.query(MaterialCategory).filter(MaterialCategory.id == target_cat_id).first()
-        if not target_cat: return {"code": 404, "message": "目标分类不存在"}
-        
-        for m in mats:
-            # 减少旧分类计数
-            old_cat = db.query(MaterialCategory).filter(MaterialCategory.id == m.category_id).first()
-            if old_cat and old_cat.total_count > 0: old_cat.total_count -= 1
-            
-            # 移动
-            m.category_id = target_cat_id
-            
-            # 增加新分类计数
-            target_cat.total_count += 1
+    if action == "move" and not target_cat_id:
+        return {"code": 400, "message": "请选择目标分类"}
+    if action not in ("delete", "move"):
+        return {"code": 400, "message": "未知操作"}
 
-    db.commit()
-    return {"code": 200, "message": f"成功操作 {len(ids)} 条素材"}
+    # 🟢 同步 Session 的查询 / 批量更新 / 提交放到线程池，不阻塞事件循环
+    def operate():
+        if action == "delete":
+            count, pool_ids = MaterialService.batch_delete(db, ids), []
+        else:
+            if not db.query(MaterialCategory.id).filter(MaterialCategory.id == target_cat_id).first():
+                return None
+            count, pool_ids = MaterialService.batch_move(db, ids, target_cat_id)
+        db.commit()
+        return count, pool_ids
+
+    result = await run_in_threadpool(operate)
+    if result is None:
+        return {"code": 404, "message": "目标分类不存在"}
+    count, pool_ids = result
+
+    # 🟢 删除的素材会在领取时被条件更新跳过；移动的未使用素材需要补进目标分类的库存池
+    if pool_ids:
+        await MaterialPool.push(target_cat_id, pool_ids)
+    return {"code": 200, "message": f"成功操作 {count} 条素材"}
 
 # 4. 分类管理 (保持不变)
 @router.post("/category/add")
@@ -137,10 +156,20 @@ async def add_material_category(name: str = Form(...), db: Session = Depends(get
     db.commit()
     return {"code": 200, "message": "分类创建成功"}
 
+# 5. 🟢 库存池对账：以 materials 表为准重建 Redis 素材池 (cat_id=0 表示全部分类)
+@router.post("/pool/reconcile")
+async def reconcile_material_pool(cat_id: int = Form(0), db: AsyncSession = Depends(get_async_db), current_user: User = Depends(deps.get_current_admin)):
+    if cat_id > 0:
+        result = {cat_id: await MaterialPool.reconcile_async(db, cat_id)}
+    else:
+        result = await MaterialPool.reconcile_all_async(db)
+    return {"code": 200, "message": "库存池已重建", "data": result}
+
 @router.post("/category/delete")
 async def delete_material_category(cat_id: int = Form(...), db: Session = Depends(get_db), current_user: User = Depends(deps.get_current_admin)):
     cat = db.query(MaterialCategory).filter(MaterialCategory.id == cat_id).first()
     if cat:
         db.delete(cat)
         db.commit()
+        await redis_conn.delete(MaterialPool.pool_key(cat_id), MaterialPool.loaded_key(cat_id))
     return {"code": 200, "message": "删除成功"}
\ No newline at end of file
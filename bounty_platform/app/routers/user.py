@@ -4,6 +4,9 @@ from datetime import datetime
 from ..database import get_db
 from .. import models
 from ..core import deps
+from ..services.ledger_service import LedgerService
+from ..services.badge_service import BadgeService
+from ..services.notification_service import NotificationService
 
 router = APIRouter(prefix="/user", tags=["User"])
 
@@ -14,7 +17,8 @@ def checkin(user: models.User = Depends(deps.get_current_active_user), db: Sessi
         return {"code": 400, "message": "今日已签到"}
         
     db.add(models.CheckIn(user_id=user.id, date=today))
-    user.balance += 0.5
-    db.add(models.Notification(user_id=user.id, title="签到奖励", content="获得 0.5 元"))
+    LedgerService.change_balance(db, user, 0.5, "checkin", "每日签到奖励")
+    NotificationService.send(db, user.id, "签到奖励", "获得 0.5 元")
+    BadgeService.on_checkin(db, user.id, today)
     db.commit()
     return {"code": 200, "message": "签到成功 +0.5元"}
\ No newline at end of file
@@ -0,0 +1,129 @@
+import json
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session, joinedload
+from app import models
+from app.services.badge_service import BadgeService
+from app.services.jobs import JobQueue
+from app.services.ledger_service import LedgerService
+from app.services.ref_data import RefData
+from app.services.stats_service import StatsService
+
+# 可审核的状态 (初审 / 申诉复审)；已结算的不会被重复处理
+REVIEWABLE_STATUSES = ("pending", "appealing")
+
+
+class AuditService:
+    """
+    任务审核结算 (单条审核也走这里)
+    - 一次查询加载 提交 + 任务 + 用户 (FOR UPDATE)，不再逐条懒加载
+    - 提交状态 / 结算金额一条 UPDATE ... CASE 写入
+    - 本人奖励由 LedgerService.credit_many 一条 UPDATE 入账；整批一个事务，由调用方 commit
+    - 勋章计数与上级提成写入发件箱 (submission_approved)，提交后由后台任务执行
+    - 审核列表固定 3 条查询：COUNT + 提交 (JOIN 用户 / 任务) + 一次 IN 查素材
+    """
+
+    # ---------- 审核列表 ----------
+    @staticmethod
+    def _parse_images(images) -> list:
+        if not images:
+            return []
+        if isinstance(images, str):
+            try:
+                images = json.loads(images)
+            except ValueError:
+                return [images]
+        return images if isinstance(images, list) else [images]
+
+    @staticmethod
+    def prefetch_ref_images(db: Session, subs: List[models.Submission]):
+        """一次 IN 查询取出本页所有分配素材，把参考图挂到 sub.ref_images 上"""
+        mat_ids = {s.assigned_material_id for s in subs if s.assigned_material_id}
+        images = {}
+        if mat_ids:
+            rows = db.query(models.Material.id, models.Material.images).filter(models.Material.id.in_(mat_ids)).all()
+            images = {mat_id: AuditService._parse_images(imgs) for mat_id, imgs in rows}
+        for sub in subs:
+            sub.ref_images = images.get(sub.assigned_material_id, [])
+
+    @staticmethod
+    def list_page(db: Session, status: str, page: int, page_size: int) -> Tuple[List[models.Submission], int]:
+        query = db.query(models.Submission).filter(models.Submission.status == status)
+        total = query.count()
+        subs = query.options(joinedload(models.Submission.user), joinedload(models.Submission.task))\
+            .order_by(models.Submission.created_at.desc()).offset((page-1)*page_size).limit(page_size).all()
+        AuditService.prefetch_ref_images(db, subs)
+        return subs, total
+
+    @staticmethod
+    def review(
+        db: Session, submission_ids: Iterable[int], action: str,
+        feedback: Optional[str] = None, amounts: Optional[Dict[int, float]] = None
+    ) -> dict:
+        """
+        action: approve / reject；amounts 为动态定价任务的结算金额 {submission_id: 金额}
+        返回 {"approved": n, "rejected": n, "skipped": [未处理的 submission_id]}
+        """
+        ids = list({int(i) for i in submission_ids})
+        amounts = {int(k): float(v) for k, v in (amounts or {}).items()}
+        result = {"approved": 0, "rejected": 0, "skipped": []}
+        if not ids or action not in ("approve", "reject"):
+            result["skipped"] = ids
+            return result
+
+        S = models.Submission
+        rows = db.query(
+            S.id, S.user_id, S.status, models.Task.title, models.Task.price, models.Task.price_mode,
+            models.User.username, models.User.inviter_id
+        ).join(models.Task, models.Task.id == S.task_id).join(models.User, models.User.id == S.user_id)\
+            .filter(S.id.in_(ids), S.status.in_(REVIEWABLE_STATUSES)).order_by(S.id).with_for_update().all()
+
+        if action == "approve":
+            rewards = {}
+            for r in rows:
+                if r.price_mode == "dynamic":
+                    if r.id not in amounts:  # 动态定价必须由审核员给出金额
+                        continue
+                    rewards[r.id] = amounts[r.id]
+                else:
+                    rewards[r.id] = r.price or 0
+            rows = [r for r in rows if r.id in rewards]
+            if rows:
+                # 通过数在后台任务里 record，先在状态变更前建好计数行
+                BadgeService.ensure_stats(db, [r.user_id for r in rows])
+                db.execute(
+                    update(S).where(S.id.in_(list(rewards)), S.status.in_(REVIEWABLE_STATUSES))
+                    .values(status="approved", final_amount=case(rewards, value=S.id, else_=S.final_amount))
+                    .execution_options(synchronize_session=False)
+                )
+                # 本人奖励同步入账；勋章计数与上级提成作为发件箱任务随本事务提交，提交后异步执行
+                LedgerService.credit_many(db, [
+                    {"user_id": r.user_id, "amount": rewards[r.id], "biz_type": "task_reward", "title": f"任务奖励: {r.title}", "ref_id": r.id}
+                    for r in rows
+                ])
+                rate = RefData.get(db).commission_rate  # 后台 "推广返佣" 配置
+                JobQueue.enqueue(db, "submission_approved", {
+                    "approved": dict(Counter(r.user_id for r in rows)),
+                    "commissions": [
+                        {"user_id": r.inviter_id, "amount": rewards[r.id] * rate, "title": f"好友任务提成: {r.username}", "ref_id": r.id}
+                        for r in rows if r.inviter_id
+                    ],
+                })
+            new_status = "approved"
+        else:
+            if rows:
+                db.execute(
+                    update(S).where(S.id.in_([r.id for r in rows]), S.status.in_(REVIEWABLE_STATUSES))
+                    .values(status="rejected", admin_feedback=feedback)
+                    .execution_options(synchronize_session=False)
+                )
+            new_status = "rejected"
+
+        for old_status, n in Counter(r.status for r in rows).items():
+            StatsService.submission_status_changed(db, old_status, new_status, n)
+
+        done = {r.id for r in rows}
+        result["approved" if action == "approve" else "rejected"] = len(done)
+        result["skipped"] = [i for i in ids if i not in done]
+        return result
@@ -0,0 +1,233 @@
+import argparse
+import gzip
+import json
+import os
+import zlib
+from datetime import date, datetime
+from typing import Iterator, Optional
+from sqlalchemy import Date, DateTime, Integer, MetaData, create_engine, select, text
+from sqlalchemy.engine import Connection, Engine
+from app import models  # noqa: F401  恢复到空库时需要 models 建表
+from app.database import Base, engine
+from app.core.logger import logger
+
+FORMAT_VERSION = 2
+STATE_PATH = "app/database/backup_state.json"
+# 只追加、从不修改 / 删除的表：增量备份只导出主键大于水位线的新行；其余表增量备份时整表导出
+APPEND_ONLY_TABLES = {"ledger_entries", "audit_logs", "checkins", "image_fingerprints"}
+
+
+class BackupService:
+    """
+    纯 Python 备份 / 恢复，SQLite 与 MySQL 通用，不依赖 mysqldump
+    - 表结构取自数据库反射 (不依赖 models 与库表是否同步)
+    - 按外键顺序逐表导出，每表按主键分块 (WHERE pk > 上一块末尾 ORDER BY pk LIMIT n)，边读边 gzip
+    - 文件格式为 gzip 压缩的 JSON Lines：meta 行 → 每表一行列名 + 若干行数据块 → end 行 (含水位线)
+    - 增量备份：APPEND_ONLY_TABLES (流水 / 审核日志 / 签到 / 指纹，体量最大) 只导出主键大于上次水位线的新行，
+      其余表 (余额、审核结果等会被修改或删除) 整表导出，避免 全量 + 增量 恢复后回退到旧数据
+    - 水位线只由命令行备份推进；后台下载的增量备份基于同一水位线，但不修改它
+    - 恢复：全量先清空再插入；增量中整表导出的表先清空再插入，只追加的表按主键先删后插；
+      整个恢复一个事务，文件不完整时回滚
+    """
+    CHUNK = 2000
+    COMPRESS_LEVEL = 6
+
+    @staticmethod
+    def _pk(table):
+        cols = list(table.primary_key.columns)
+        return cols[0] if len(cols) == 1 else None
+
+    @staticmethod
+    def _encode(v):
+        return v.isoformat() if isinstance(v, (datetime, date)) else v
+
+    # ---------- 状态 (上次备份的水位线) ----------
+    @staticmethod
+    def load_state() -> Optional[dict]:
+        if not os.path.exists(STATE_PATH):
+            return None
+        with open(STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def save_state(state: dict):
+        os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+        tmp = STATE_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, STATE_PATH)
+
+    # ---------- 导出 ----------
+    @staticmethod
+    def _chunks(conn: Connection, table, pk, cond=None) -> Iterator[list]:
+        last = None
+        while True:
+            stmt = select(table)
+            if cond is not None:
+                stmt = stmt.where(cond)
+            if last is not None:
+                stmt = stmt.where(pk > last)
+            rows = conn.execute(stmt.order_by(pk).limit(BackupService.CHUNK)).fetchall()
+            if not rows:
+                return
+            yield rows
+            last = rows[-1]._mapping[pk.name]
+            if len(rows) < BackupService.CHUNK:
+                return
+
+    @staticmethod
+    def iter_lines(since: Optional[dict] = None, state: Optional[dict] = None, bind: Engine = engine) -> Iterator[str]:
+        """
+        逐行产出备份内容；since 为上次备份的状态 (None 表示全量)
+        导出完成后把本次状态写入 state (供下次增量使用)
+        """
+        started_at = datetime.now().isoformat()
+        since_marks = (since or {}).get("watermarks", {})
+        since_time = (since or {}).get("started_at")
+        marks = {}
+        yield json.dumps({"format": FORMAT_VERSION, "incremental": since is not None, "since": since_time, "started_at": started_at, "dialect": bind.dialect.name})
+
+        with bind.connect() as conn:
+            schema = MetaData()
+            schema.reflect(bind=conn)
+            for table in schema.sorted_tables:
+                pk = BackupService._pk(table)
+                columns = [c.name for c in table.columns]
+
+                int_pk = pk is not None and isinstance(pk.type, Integer)
+                mark = since_marks.get(table.name)
+                append = since is not None and int_pk and table.name in APPEND_ONLY_TABLES and mark is not None
+                yield json.dumps({"table": table.name, "columns": columns, "mode": "append" if append else "full"})
+                cond = pk > mark if append else None
+
+                top = mark
+                if pk is None:
+                    result = conn.execution_options(stream_results=True).execute(select(table))
+                    chunks = result.partitions(BackupService.CHUNK)
+                else:
+                    chunks = BackupService._chunks(conn, table, pk, cond)
+                for rows in chunks:
+                    yield json.dumps({"rows": [[BackupService._encode(v) for v in r] for r in rows]}, ensure_ascii=False, default=str)
+                    if int_pk:
+                        last = rows[-1]._mapping[pk.name]
+                        top = last if top is None else max(top, last)
+                if int_pk and top is not None:
+                    marks[table.name] = top
+
+        yield json.dumps({"end": True, "watermarks": marks})
+        if state is not None:
+            state.update(started_at=started_at, watermarks=marks)
+
+    @staticmethod
+    def iter_backup(incremental: bool = False, bind: Engine = engine, save_state: bool = True) -> Iterator[bytes]:
+        """gzip 流 (可直接作为 StreamingResponse 输出)；save_state=True 时导出完整结束后才更新水位线"""
+        since = BackupService.load_state() if incremental else None
+        state = {}
+        comp = zlib.compressobj(BackupService.COMPRESS_LEVEL, zlib.DEFLATED, 31)  # wbits=31：gzip 格式
+        for line in BackupService.iter_lines(since, state, bind):
+            data = comp.compress((line + "\n").encode("utf-8"))
+            if data:
+                yield data
+        yield comp.flush()
+        if save_state:
+            BackupService.save_state(state)
+
+    @staticmethod
+    def backup_to_file(path: str, incremental: bool = False, bind: Engine = engine) -> str:
+        tmp = path + ".part"
+        with open(tmp, "wb") as f:
+            for data in BackupService.iter_backup(incremental, bind):
+                f.write(data)
+        os.replace(tmp, path)
+        return path
+
+    # ---------- 恢复 ----------
+    @staticmethod
+    def _decoder(col):
+        if isinstance(col.type, DateTime):
+            return lambda v: datetime.fromisoformat(v) if isinstance(v, str) else v
+        if isinstance(col.type, Date):
+            return lambda v: date.fromisoformat(v) if isinstance(v, str) else v
+        return None
+
+    @staticmethod
+    def restore(path: str, bind: Engine = engine) -> dict:
+        """从备份文件恢复，返回 {表名: 恢复行数}"""
+        Base.metadata.create_all(bind=bind)
+        counts = {}
+        with gzip.open(path, "rt", encoding="utf-8") as f, bind.begin() as conn:
+            meta = json.loads(f.readline())
+            if meta.get("format") not in (1, FORMAT_VERSION):
+                raise ValueError(f"不支持的备份格式: {meta.get('format')}")
+            incremental = meta["incremental"]
+            schema = MetaData()
+            schema.reflect(bind=conn)
+            is_mysql = conn.dialect.name == "mysql"
+            if is_mysql:
+                conn.execute(text("SET FOREIGN_KEY_CHECKS=0"))
+            if not incremental:
+                for table in reversed(schema.sorted_tables):
+                    conn.execute(table.delete())
+
+            table = pk = None
+            columns, decoders, complete = [], {}, False
+            for line in f:
+                item = json.loads(line)
+                if "table" in item:
+                    table = schema.tables.get(item["table"])
+                    if table is None:
+                        logger.warning(f"Restore: table {item['table']} no longer exists, skipped")
+                        continue
+                    pk = BackupService._pk(table)
+                    # 增量文件里整表导出的表：先清空，备份之后删除的行不会残留 (旧格式文件没有 mode，按主键覆盖)
+                    append = item.get("mode", "append") == "append"
+                    if incremental and not append:
+                        conn.execute(table.delete())
+                    columns = item["columns"]
+                    decoders = {name: BackupService._decoder(table.c[name]) for name in columns if name in table.c}
+                    counts[table.name] = 0
+                elif "rows" in item:
+                    if table is None:
+                        continue
+                    rows = []
+                    for raw in item["rows"]:
+                        row = {}
+                        for name, v in zip(columns, raw):
+                            if name not in decoders:  # 备份后删除的列
+                                continue
+                            dec = decoders[name]
+                            row[name] = dec(v) if dec and v is not None else v
+                        rows.append(row)
+                    if incremental and append and pk is not None:
+                        conn.execute(table.delete().where(pk.in_([r[pk.name] for r in rows])))
+                    conn.execute(table.insert(), rows)
+                    counts[table.name] += len(rows)
+                elif item.get("end"):
+                    complete = True
+
+            if not complete:
+                raise ValueError("备份文件不完整 (缺少结束标记)，已回滚")
+            if is_mysql:
+                conn.execute(text("SET FOREIGN_KEY_CHECKS=1"))
+        return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="数据库备份 / 恢复")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_backup = sub.add_parser("backup")
+    p_backup.add_argument("-o", "--output", default=None, help="输出文件 (默认 backup_<时间>.jsonl.gz)")
+    p_backup.add_argument("--incremental", action="store_true", help="基于上次备份的水位线做增量备份")
+    p_backup.add_argument("--url", default=None, help="数据库连接串 (默认使用 DATABASE_URL)")
+    p_restore = sub.add_parser("restore")
+    p_restore.add_argument("file")
+    p_restore.add_argument("--url", default=None, help="数据库连接串 (默认使用 DATABASE_URL)")
+    args = parser.parse_args()
+
+    bind = create_engine(args.url) if args.url else engine
+    if args.cmd == "backup":
+        suffix = "_inc" if args.incremental else ""
+        output = args.output or f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}.jsonl.gz"
+        print(f"✅ Backup written: {BackupService.backup_to_file(output, args.incremental, bind)}")
+    else:
+        print(f"✅ Restored: {BackupService.restore(args.file, bind)}")
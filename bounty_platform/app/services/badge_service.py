@@ -1,37 +1,221 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 from app import models
+from app.core.user_cache import UserCache
+from app.services.notification_service import NotificationService
+
+# 计入累计收入的流水类型 (与收入榜一致)
+EARNING_BIZ_TYPES = ("task_reward", "commission", "checkin")
+
+
+class Badge(NamedTuple):
+    code: str
+    name: str
+    metric: str       # UserStats 上的计数字段
+    threshold: float  # 计数达到该值即获得
+
+
+# 勋章规则表：新增勋章只需加一行，不增加任何查询
+BADGES = [
+    Badge("first_gold", "第一桶金", "lifetime_earnings", 10),
+    Badge("task_master", "任务达人", "approved_count", 10),
+    Badge("checkin_week", "坚持不懈", "checkin_streak", 7),
+]
+
+# metric -> (按阈值排序的阈值列表, 对应勋章)
+_RULES = {}
+for _b in sorted(BADGES, key=lambda b: b.threshold):
+    _RULES.setdefault(_b.metric, ([], []))
+    _RULES[_b.metric][0].append(_b.threshold)
+    _RULES[_b.metric][1].append(_b)
+
 
 class BadgeService:
+    """
+    成就引擎
+    - 每个用户一行 UserStats 计数 (通过数 / 累计收入 / 连续签到)，变动时按增量 UPDATE
+    - 规则按 计数字段 + 阈值 声明；判定只看本次变动前后的计数跨过了哪些阈值，与历史数据量无关
+    - 勋章、通知批量写入，不 commit，随调用方事务提交
+    """
+
+    @staticmethod
+    def _crossed(metric: str, old: float, new: float) -> List[Badge]:
+        """计数从 old 变为 new 时新跨过的勋章"""
+        if metric not in _RULES or new <= old:
+            return []
+        thresholds, badges = _RULES[metric]
+        return badges[bisect_right(thresholds, old):bisect_right(thresholds, new)]
+
+    # ---------- 计数 ----------
+    @staticmethod
+    def _history(db: Session, user_ids: List[int]) -> Dict[int, dict]:
+        """按历史数据计算计数 (新用户首次建行 / 全量重建时使用)"""
+        S, L = models.Submission, models.LedgerEntry
+        approved = dict(
+            db.query(S.user_id, func.count(S.id))
+            .filter(S.user_id.in_(user_ids), S.status == "approved").group_by(S.user_id).all()
+        )
+        earnings = dict(
+            db.query(L.user_id, func.sum(L.amount))
+            .filter(L.user_id.in_(user_ids), L.biz_type.in_(EARNING_BIZ_TYPES), L.amount > 0).group_by(L.user_id).all()
+        )
+        return {uid: {"approved_count": approved.get(uid, 0), "lifetime_earnings": earnings.get(uid) or 0.0} for uid in user_ids}
+
+    @staticmethod
+    def _ensure_rows(db: Session, deltas: Dict[int, dict]):
+        """
+        还没有计数行的用户按历史数据建行
+        调用前已 flush，历史数据里已经包含本次变动，所以先扣掉本次增量，后面统一 UPDATE 加回来
+        """
+        ids = list(deltas)
+        existing = {uid for (uid,) in db.query(models.UserStats.user_id).filter(models.UserStats.user_id.in_(ids))}
+        missing = [uid for uid in ids if uid not in existing]
+        if not missing:
+            return
+        history = BadgeService._history(db, missing)
+        rows = [
+            dict(
+                user_id=uid, checkin_streak=0,
+                approved_count=history[uid]["approved_count"] - deltas[uid].get("approved_count", 0),
+                lifetime_earnings=history[uid]["lifetime_earnings"] - deltas[uid].get("lifetime_earnings", 0),
+            ) for uid in missing
+        ]
+        # 两个首次事务 (如签到与审核) 可能同时判断缺行：用 INSERT IGNORE，后到的一方等先到的提交后跳过建行，
+        # 自己的增量由随后的 UPDATE 加到已建好的行上，不会因主键冲突让签到 / 审核失败
+        if db.get_bind().dialect.name == "mysql":
+            stmt = mysql_insert(models.UserStats).prefix_with("IGNORE")
+        else:
+            stmt = sqlite_insert(models.UserStats).on_conflict_do_nothing(index_elements=["user_id"])
+        db.execute(stmt, rows)
+
     @staticmethod
-    def check_and_award(user: models.User, db: Session):
+    def ensure_stats(db: Session, user_ids: List[int]):
         """
-        每次任务审核通过后调用，检查是否达成成就
+        计数变动要延后到后台任务里 record 时，先在写库之前给这些用户建好计数行
+        否则中途有别的计数变动先按历史建行，会把尚未 record 的变动也算进去
         """
-        # 1. 确保 medals 是列表
-        if not user.medals: user.medals = []
-        current_medals = set(user.medals) if isinstance(user.medals, list) else set()
-        new_medals = []
-
-        # 2. 判定逻辑
-        # 成就A: 第一桶金 (余额累计超过 10 元) -> 实际场景建议记总收入字段，这里用余额近似
-        if user.balance >= 10 and "first_gold" not in current_medals:
-            new_medals.append("first_gold")
-            db.add(models.Notification(user_id=user.id, title="恭喜获得勋章", content="达成成就【第一桶金】！"))
-
-        # 成就B: 任务达人 (完成任务超过 10 单)
-        completed_count = db.query(models.Submission).filter(
-            models.Submission.user_id == user.id, 
-            models.Submission.status == "approved"
-        ).count()
-        
-        if completed_count >= 10 and "task_master" not in current_medals:
-            new_medals.append("task_master")
-            db.add(models.Notification(user_id=user.id, title="恭喜获得勋章", content="达成成就【任务达人】！"))
-
-        # 3. 更新数据库
-        if new_medals:
+        BadgeService._ensure_rows(db, {uid: {} for uid in set(user_ids)})
+
+    @staticmethod
+    def record(db: Session, deltas: Dict[int, dict]) -> int:
+        """
+        累加计数并颁发新跨过阈值的勋章，返回获得新勋章的人数
+        deltas: {user_id: {"approved_count": 1, "lifetime_earnings": 2.5}}
+        本次变动须已写库 (提交状态已更新 / 流水已添加)，且尚未 record 的其它计数变动不能先写库
+        无论多少用户：一次 UPDATE ... CASE + 一次读回 (+ 有人得勋章时一次加载用户)
+        """
+        deltas = {uid: {m: v for m, v in d.items() if v} for uid, d in deltas.items()}
+        deltas = {uid: d for uid, d in deltas.items() if d}
+        if not deltas:
+            return 0
+        db.flush()
+        BadgeService._ensure_rows(db, deltas)
+
+        US = models.UserStats
+        values = {}
+        for metric in ("approved_count", "lifetime_earnings"):
+            per_user = {uid: d[metric] for uid, d in deltas.items() if metric in d}
+            if per_user:
+                col = getattr(US, metric)
+                values[metric] = func.coalesce(col, 0) + case(per_user, value=US.user_id, else_=0)
+        db.execute(
+            update(US).where(US.user_id.in_(list(deltas))).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+        earned = defaultdict(list)
+        rows = db.query(US.user_id, US.approved_count, US.lifetime_earnings).filter(US.user_id.in_(list(deltas))).all()
+        for row in rows:
+            for metric, delta in deltas[row.user_id].items():
+                new = getattr(row, metric) or 0
+                earned[row.user_id].extend(BadgeService._crossed(metric, new - delta, new))
+        return BadgeService._grant_many(db, earned)
+
+    @staticmethod
+    def on_checkin(db: Session, user_id: int, date: str) -> int:
+        """签到后调用 (date 格式 YYYY-MM-DD)：昨天签过则连续天数 +1，否则重置为 1"""
+        db.flush()
+        stats = db.get(models.UserStats, user_id)
+        if stats is None:
+            BadgeService._ensure_rows(db, {user_id: {}})
+            stats = db.get(models.UserStats, user_id)
+        if stats.last_checkin_date == date:
+            return 0
+        yesterday = (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+        old = stats.checkin_streak or 0
+        stats.checkin_streak = old + 1 if stats.last_checkin_date == yesterday else 1
+        stats.last_checkin_date = date
+        return BadgeService._grant_many(db, {user_id: BadgeService._crossed("checkin_streak", old, stats.checkin_streak)})
+
+    # ---------- 颁发 ----------
+    @staticmethod
+    def _grant_many(db: Session, earned: Dict[int, List[Badge]]) -> int:
+        earned = {uid: badges for uid, badges in earned.items() if badges}
+        if not earned:
+            return 0
+        rows, notices, awarded = [], [], 0
+        for user in db.query(models.User).filter(models.User.id.in_(list(earned))).all():
+            current = list(user.medals) if isinstance(user.medals, list) else []
+            new = [b for b in earned[user.id] if b.code not in current]
+            if not new:
+                continue
             # SQLAlchemy JSON 类型更新需要显式赋值
-            updated_medals = list(current_medals.union(set(new_medals)))
-            user.medals = updated_medals
-            db.add(models.AuditLog(operator_id=0, action="system_grant", target_id=user.id, detail=f"自动颁发勋章: {new_medals}"))
-            db.commit()
\ No newline at end of file
+            user.medals = current + [b.code for b in new]
+            UserCache.mark_dirty(db, user.id)
+            notices.extend({"user_id": user.id, "title": "恭喜获得勋章", "content": f"达成成就【{b.name}】！"} for b in new)
+            rows.append(models.AuditLog(operator_id=0, action="system_grant", target_id=user.id, detail=f"自动颁发勋章: {[b.code for b in new]}"))
+            awarded += 1
+        if rows:
+            db.add_all(rows)
+        NotificationService.send_many(db, notices)
+        return awarded
+
+    # ---------- 全量重建 ----------
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """上线或数据修复时按历史数据重建全部计数，并补发已满足条件的勋章"""
+        user_ids = [uid for (uid,) in db.query(models.User.id)]
+        db.query(models.UserStats).delete(synchronize_session=False)
+
+        streaks, last_dates = {}, {}
+        rows = db.query(models.CheckIn.user_id, models.CheckIn.date)\
+            .order_by(models.CheckIn.user_id, models.CheckIn.date.desc()).yield_per(5000)
+        for uid, d in rows:
+            if uid not in last_dates:
+                last_dates[uid], streaks[uid] = d, 1
+            elif streaks[uid] > 0:
+                prev = (datetime.strptime(last_dates[uid], "%Y-%m-%d") - timedelta(days=streaks[uid])).strftime("%Y-%m-%d")
+                if d == prev:
+                    streaks[uid] += 1
+                elif d != last_dates[uid]:
+                    streaks[uid] = -streaks[uid]  # 连续中断，之后的记录不再计入
+        streaks = {uid: abs(n) for uid, n in streaks.items()}
+
+        awarded, chunk = 0, 1000
+        for i in range(0, len(user_ids), chunk):
+            ids = user_ids[i:i + chunk]
+            history = BadgeService._history(db, ids)
+            mappings, earned = [], {}
+            for uid in ids:
+                stats = dict(history[uid], checkin_streak=streaks.get(uid, 0), last_checkin_date=last_dates.get(uid))
+                mappings.append(dict(stats, user_id=uid))
+                earned[uid] = [b for b in BADGES if (stats[b.metric] or 0) >= b.threshold]
+            db.bulk_insert_mappings(models.UserStats, mappings)
+            awarded += BadgeService._grant_many(db, earned)
+        db.commit()
+        return awarded
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    session = SessionLocal()
+    try:
+        print(f"✅ User stats rebuilt, {BadgeService.rebuild(session)} users got new medals")
+    finally:
+        session.close()
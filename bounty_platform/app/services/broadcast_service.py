@@ -0,0 +1,99 @@
+from bisect import bisect_right
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from app import models
+from app.services.notification_service import NotificationService
+
+# 群发对象
+SEGMENTS = {"all": "全部用户", "tag": "标签用户", "vip": "VIP 会员", "inviter": "邀请树"}
+
+
+class BroadcastService:
+    """
+    分群群发
+    - 管理员只写一行 Broadcast 就返回，实际写信由 Celery 任务 fanout_broadcast 完成
+    - 按用户 id 升序分块 (CHUNK)，每块一条批量 INSERT + 更新断点，一个短事务提交，不长时间锁表
+    - 每块开始时 FOR UPDATE 锁住 Broadcast 行，重复投递的任务会排队并从最新断点继续，不会重复发送
+    - 单次任务最多处理 CHUNKS_PER_RUN 块后重新入队，百万级群发不会长期占住一个 worker
+    """
+    CHUNK = 1000
+    CHUNKS_PER_RUN = 50
+
+    @staticmethod
+    def create(db: Session, title: str, content: str, segment: str, segment_value: Optional[str], operator_id: int) -> models.Broadcast:
+        """校验不通过抛 ValueError；不 commit"""
+        segment_value = (segment_value or "").strip() or None
+        if segment not in SEGMENTS:
+            raise ValueError("未知的群发对象")
+        if segment == "tag" and not segment_value:
+            raise ValueError("请填写标签")
+        if segment == "inviter" and not (segment_value or "").isdigit():
+            raise ValueError("请填写邀请人 ID")
+        b = models.Broadcast(
+            title=title, content=content, type="system", segment=segment, segment_value=segment_value,
+            status="pending", sent_count=0, last_user_id=0, created_by=operator_id
+        )
+        db.add(b)
+        db.flush()
+        return b
+
+    # ---------- 目标用户 ----------
+    @staticmethod
+    def descendants(db: Session, root_id: int) -> List[int]:
+        """邀请树 (不含根) 的全部用户 id，按层 IN 查询，返回升序列表"""
+        U = models.User
+        found, frontier = set(), [root_id]
+        while frontier:
+            level = []
+            for i in range(0, len(frontier), BroadcastService.CHUNK):
+                chunk = frontier[i:i + BroadcastService.CHUNK]
+                level.extend(uid for (uid,) in db.query(U.id).filter(U.inviter_id.in_(chunk)))
+            frontier = [uid for uid in level if uid not in found and uid != root_id]
+            found.update(frontier)
+        return sorted(found)
+
+    @staticmethod
+    def _next_ids(db: Session, b: models.Broadcast, now: datetime, tree: Optional[List[int]]) -> List[int]:
+        last, size = b.last_user_id or 0, BroadcastService.CHUNK
+        if b.segment == "inviter":
+            start = bisect_right(tree, last)
+            return tree[start:start + size]
+        if b.segment == "tag":
+            T = models.UserTag
+            q = db.query(T.user_id).filter(T.tag == b.segment_value, T.user_id > last).order_by(T.user_id)
+        else:
+            U = models.User
+            q = db.query(U.id).filter(U.id > last)
+            if b.segment == "vip":
+                q = q.filter(U.vip_end_time > now)
+            q = q.order_by(U.id)
+        return [uid for (uid,) in q.limit(size)]
+
+    # ---------- 分块写入 ----------
+    @staticmethod
+    def run(db: Session, broadcast_id: int, max_chunks: int = CHUNKS_PER_RUN) -> bool:
+        """发送至多 max_chunks 块，返回是否已全部发完"""
+        B = models.Broadcast
+        now = datetime.now()
+        tree = None
+        for _ in range(max_chunks):
+            b = db.query(B).filter(B.id == broadcast_id).with_for_update().first()
+            if b is None or b.status == "done":
+                db.rollback()
+                return True
+            if b.segment == "inviter" and tree is None:
+                tree = BroadcastService.descendants(db, int(b.segment_value))
+            ids = BroadcastService._next_ids(db, b, now, tree)
+            if not ids:
+                b.status, b.finished_at = "done", datetime.now()
+                db.commit()
+                return True
+            NotificationService.send_many(db, [
+                {"user_id": uid, "title": b.title, "content": b.content, "type": b.type} for uid in ids
+            ])
+            b.status = "sending"
+            b.last_user_id = ids[-1]
+            b.sent_count = (b.sent_count or 0) + len(ids)
+            db.commit()
+        return False
@@ -0,0 +1,126 @@
+import base64
+import random
+import string
+import time
+from typing import Tuple
+from captcha.image import ImageCaptcha
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.logger import logger
+from app.database import redis_conn, redis_sync
+
+# 弹出一张验证码 + 维护统计 (一次往返)：served / misses 计数，low_water 为观测到的最低库存
+_POP_SCRIPT = """
+local item = redis.call('LPOP', KEYS[1])
+if not item then
+    redis.call('HINCRBY', KEYS[2], 'misses', 1)
+    redis.call('HSET', KEYS[2], 'low_water', 0)
+    return false
+end
+local left = redis.call('LLEN', KEYS[1])
+redis.call('HINCRBY', KEYS[2], 'served', 1)
+local low = redis.call('HGET', KEYS[2], 'low_water')
+if (not low) or left < tonumber(low) then
+    redis.call('HSET', KEYS[2], 'low_water', left)
+end
+return item
+"""
+
+# 画图对象创建时要加载字体，进程内复用
+_image = None
+
+
+class CaptchaPool:
+    """
+    验证码预生成池
+    - 独立进程 (python -m app.services.captcha_pool) 持续把 (验证码, PNG) 补到 Redis 列表，数量有上限
+    - 接口取验证码只是一次 LPOP + base64 解码；池子空了才在线程池里现画，不阻塞事件循环
+    - captcha:stats 记录 served / misses / low_water，low_water 偏低说明需要加大池子或生产速度
+    """
+    POOL_KEY = "captcha:pool"
+    STATS_KEY = "captcha:stats"
+    BATCH = 100
+
+    _pop_script = None
+
+    # ---------- 生成 ----------
+    @staticmethod
+    def render() -> Tuple[str, bytes]:
+        global _image
+        if _image is None:
+            _image = ImageCaptcha(width=120, height=50)
+        code = "".join(random.choices(string.digits, k=4))
+        return code, _image.generate(code).getvalue()
+
+    @staticmethod
+    def _pack(code: str, png: bytes) -> str:
+        return f"{code}:{base64.b64encode(png).decode('ascii')}"
+
+    @staticmethod
+    def _unpack(item: str) -> Tuple[str, bytes]:
+        code, data = item.split(":", 1)
+        return code, base64.b64decode(data)
+
+    # ---------- 取用 ----------
+    @staticmethod
+    async def pop() -> Tuple[str, bytes]:
+        try:
+            if CaptchaPool._pop_script is None:
+                CaptchaPool._pop_script = redis_conn.register_script(_POP_SCRIPT)
+            item = await CaptchaPool._pop_script(keys=[CaptchaPool.POOL_KEY, CaptchaPool.STATS_KEY])
+            if item:
+                return CaptchaPool._unpack(item)
+        except Exception as e:
+            logger.warning(f"Captcha pool unavailable: {e}")
+        return await run_in_threadpool(CaptchaPool.render)
+
+    # ---------- 补充 (生产进程) ----------
+    @staticmethod
+    def refill() -> int:
+        """补到 CAPTCHA_POOL_SIZE，返回本次新增数量"""
+        added, size = 0, settings.CAPTCHA_POOL_SIZE
+        while True:
+            missing = size - redis_sync.llen(CaptchaPool.POOL_KEY)
+            if missing <= 0:
+                break
+            batch = [CaptchaPool._pack(*CaptchaPool.render()) for _ in range(min(missing, CaptchaPool.BATCH))]
+            pipe = redis_sync.pipeline(transaction=False)
+            pipe.rpush(CaptchaPool.POOL_KEY, *batch)
+            pipe.ltrim(CaptchaPool.POOL_KEY, 0, size - 1)  # 多个生产进程同时补时保证不超上限
+            pipe.execute()
+            added += len(batch)
+        return added
+
+    @staticmethod
+    def run_forever():
+        logger.info(f"Captcha producer started, pool size {settings.CAPTCHA_POOL_SIZE}")
+        while True:
+            try:
+                added = CaptchaPool.refill()
+                if added:
+                    logger.info(f"Captcha pool refilled: +{added}")
+            except Exception as e:
+                logger.warning(f"Captcha pool refill failed: {e}")
+            time.sleep(settings.CAPTCHA_POOL_INTERVAL)
+
+    # ---------- 监控 ----------
+    @staticmethod
+    def stats(reset: bool = False) -> dict:
+        """当前库存 + 统计；reset=True 时清零统计，开始新的观测周期"""
+        pipe = redis_sync.pipeline(transaction=True)
+        pipe.llen(CaptchaPool.POOL_KEY)
+        pipe.hgetall(CaptchaPool.STATS_KEY)
+        if reset:
+            pipe.delete(CaptchaPool.STATS_KEY)
+        size, raw = pipe.execute()[:2]
+        return {
+            "size": size,
+            "capacity": settings.CAPTCHA_POOL_SIZE,
+            "low_water": int(raw["low_water"]) if "low_water" in raw else None,
+            "served": int(raw.get("served", 0)),
+            "misses": int(raw.get("misses", 0)),
+        }
+
+
+if __name__ == "__main__":
+    CaptchaPool.run_forever()
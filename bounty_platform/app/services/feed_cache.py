@@ -0,0 +1,127 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.database import redis_conn, redis_sync
+from app.core.logger import logger
+from app.services.tag_index import TagIndexService
+
+
+class TaskFeedCache:
+    """
+    首页任务流缓存：按 分类 + 用户标签组合 缓存已过滤好的任务列表
+    - 版本号放在 Redis，任务发布/下架时 INCR 一次即可让所有 worker 的旧缓存失效
+    - Redis 不可用时退化为进程内 LRU (LOCAL_TTL 秒过期)：其它 worker 的失效通知收不到，只能靠短 TTL 限制旧数据
+    - 读取走异步 Redis + 异步 Session (首页是 async 接口)；失效由同步的后台接口调用
+    """
+    TTL = 300
+    LOCAL_TTL = 5
+    LOCAL_MAX = 512
+    FEED_VER_KEY = "task_feed:ver"
+
+    # 进程内兜底缓存 key -> (过期时间, value)
+    _local = OrderedDict()
+    _lock = threading.Lock()
+
+    # ---------- 版本号 ----------
+    @staticmethod
+    async def _version(ver_key: str) -> str:
+        try:
+            return await redis_conn.get(ver_key) or "0"
+        except Exception:
+            return "local"  # 兜底缓存不依赖版本号，靠 LOCAL_TTL 过期
+
+    @staticmethod
+    def _bump(ver_key: str):
+        try:
+            redis_sync.incr(ver_key)
+        except Exception as e:
+            logger.warning(f"Feed cache invalidate via redis failed: {e}")
+        with TaskFeedCache._lock:
+            TaskFeedCache._local.clear()
+
+    @staticmethod
+    def invalidate():
+        """任务发布 / 下架 / 修改后调用"""
+        TaskFeedCache._bump(TaskFeedCache.FEED_VER_KEY)
+
+    # ---------- 进程内兜底 ----------
+    @staticmethod
+    def _local_get(key: str):
+        with TaskFeedCache._lock:
+            item = TaskFeedCache._local.get(key)
+            if not item:
+                return None
+            if item[0] < time.monotonic():
+                TaskFeedCache._local.pop(key, None)
+                return None
+            TaskFeedCache._local.move_to_end(key)
+            return item[1]
+
+    @staticmethod
+    def _local_set(key: str, value):
+        with TaskFeedCache._lock:
+            TaskFeedCache._local[key] = (time.monotonic() + TaskFeedCache.LOCAL_TTL, value)
+            TaskFeedCache._local.move_to_end(key)
+            while len(TaskFeedCache._local) > TaskFeedCache.LOCAL_MAX:
+                TaskFeedCache._local.popitem(last=False)
+
+    # ---------- 读写 ----------
+    @staticmethod
+    async def _get(key: str):
+        try:
+            raw = await redis_conn.get(key)
+            return json.loads(raw) if raw is not None else None
+        except Exception:
+            return TaskFeedCache._local_get(key)
+
+    @staticmethod
+    async def _set(key: str, value):
+        try:
+            await redis_conn.set(key, json.dumps(value, ensure_ascii=False), ex=TaskFeedCache.TTL)
+        except Exception:
+            TaskFeedCache._local_set(key, value)
+
+    # ---------- 序列化 ----------
+    @staticmethod
+    def serialize_task(t: models.Task) -> dict:
+        return {
+            "id": t.id, "title": t.title, "price": t.price, "price_mode": t.price_mode,
+            "reward_desc": t.reward_desc, "category": t.category,
+            "material_category_id": t.material_category_id,
+            "required_tags": t.required_tags or [],
+            "text_req": t.text_req, "image_req": t.image_req,
+            "created_at": t.created_at.strftime("%Y-%m-%d %H:%M:%S") if t.created_at else "",
+        }
+
+    @staticmethod
+    def _tag_signature(user_tags: Optional[Iterable[str]]) -> str:
+        tags = sorted(set(user_tags or []))
+        if not tags:
+            return "guest"
+        return hashlib.md5(",".join(tags).encode("utf-8")).hexdigest()
+
+    # ---------- 任务流 ----------
+    @staticmethod
+    async def get_feed(db: AsyncSession, cat: str = "all", user_tags: Optional[Iterable[str]] = None) -> List[dict]:
+        """
+        返回该分类下对当前用户可见的任务 (已按发布时间倒序)
+        规则：无 required_tags 的任务所有人可见；有门槛的任务需要用户标签与之有交集，游客不可见
+        未命中时通过 TagIndexService 倒排索引取可见任务，不再全表扫描后在 Python 里过滤
+        """
+        ver = await TaskFeedCache._version(TaskFeedCache.FEED_VER_KEY)
+        sig = TaskFeedCache._tag_signature(user_tags)
+        feed_key = f"task_feed:{ver}:{cat}:{sig}"
+
+        feed = await TaskFeedCache._get(feed_key)
+        if feed is not None:
+            return feed
+
+        tasks = (await db.execute(TagIndexService.visible_tasks_stmt(user_tags, cat))).scalars().all()
+        feed = [TaskFeedCache.serialize_task(t) for t in tasks]
+        await TaskFeedCache._set(feed_key, feed)
+        return feed
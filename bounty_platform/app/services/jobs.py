@@ -0,0 +1,178 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict
+from sqlalchemy.orm import Session
+from app import models
+from app.core.config import settings
+from app.core.logger import logger
+from app.database import SessionLocal, on_commit
+
+# 任务类型 -> 处理函数 (db, payload)；处理函数只写库不 commit，由 JobQueue 与 "标记完成" 一起提交
+_HANDLERS: Dict[str, Callable[[Session, dict], None]] = {}
+_local = threading.local()
+
+
+def job(kind: str):
+    """注册任务处理函数"""
+    def register(fn):
+        _HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+class JobQueue:
+    """
+    发件箱后台任务
+    - enqueue 把任务写进 outbox_jobs，与业务数据同一事务提交；回滚则任务一起消失
+    - 提交后触发一次消费：Celery drain_outbox (默认) 或当前进程立即执行 (JOBS_EAGER=1)；
+      python -m app.services.jobs 常驻轮询兜底，错过的触发和到期的重试都会被它捡起
+    - 每个任务单独一个事务：FOR UPDATE SKIP LOCKED 认领 → 执行 → 标记 done 一起提交，
+      多个消费者并行也只会成功执行一次；失败回滚后按指数退避重试，MAX_ATTEMPTS 次后标记 dead
+    """
+    BATCH = 100
+    MAX_ATTEMPTS = 8
+    BACKOFF_BASE = 10    # 秒，第 n 次失败后等待 BASE * 2^(n-1)
+    BACKOFF_MAX = 3600
+
+    @staticmethod
+    def enqueue(db, kind: str, payload: dict):
+        """不 commit，随调用方事务提交 (同步 / 异步 Session 均可)"""
+        db.add(models.OutboxJob(kind=kind, payload=payload, status="pending", attempts=0, next_run_at=datetime.now()))
+        session = getattr(db, "sync_session", db)
+        if JobQueue.kick not in session.info.get("after_commit_hooks", ()):
+            on_commit(db, JobQueue.kick)
+
+    @staticmethod
+    def kick():
+        if settings.JOBS_EAGER:
+            JobQueue.drain()
+        else:
+            from app.upgrade_db_v2 import drain_outbox
+            drain_outbox.delay()
+
+    # ---------- 消费 ----------
+    @staticmethod
+    def backoff(attempts: int) -> int:
+        return min(JobQueue.BACKOFF_BASE * 2 ** (attempts - 1), JobQueue.BACKOFF_MAX)
+
+    @staticmethod
+    def run_one(db: Session, job_id: int) -> bool:
+        """执行一个任务，返回是否执行成功 (已被其它消费者认领 / 已完成时返回 False)"""
+        J = models.OutboxJob
+        item = db.query(J).filter(J.id == job_id, J.status == "pending").with_for_update(skip_locked=True).first()
+        if item is None:
+            db.rollback()
+            return False
+        kind, payload = item.kind, item.payload or {}
+        try:
+            handler = _HANDLERS.get(kind)
+            if handler is None:
+                raise LookupError(f"unknown job kind: {kind}")
+            handler(db, payload)
+            item.status, item.done_at = "done", datetime.now()
+            db.commit()
+            return True
+        except Exception as e:
+            db.rollback()
+            item = db.get(J, job_id)
+            item.attempts = (item.attempts or 0) + 1
+            item.last_error = f"{type(e).__name__}: {e}"[:2000]
+            if item.attempts >= JobQueue.MAX_ATTEMPTS:
+                item.status = "dead"
+            else:
+                item.next_run_at = datetime.now() + timedelta(seconds=JobQueue.backoff(item.attempts))
+            db.commit()
+            logger.warning(f"Job {job_id} ({kind}) failed, attempt {item.attempts}: {e}")
+            return False
+
+    @staticmethod
+    def drain() -> int:
+        """执行所有到期任务，返回成功数量"""
+        if getattr(_local, "draining", False):  # 立即模式下任务里再入队，由外层循环继续处理
+            return 0
+        _local.draining = True
+        J = models.OutboxJob
+        db = SessionLocal()
+        done = 0
+        try:
+            while True:
+                ids = [i for (i,) in db.query(J.id).filter(J.status == "pending", J.next_run_at <= datetime.now())
+                       .order_by(J.id).limit(JobQueue.BATCH)]
+                db.rollback()
+                progressed = 0
+                for job_id in ids:
+                    progressed += JobQueue.run_one(db, job_id)
+                done += progressed
+                if len(ids) < JobQueue.BATCH or not progressed:
+                    return done
+        finally:
+            db.close()
+            _local.draining = False
+
+    @staticmethod
+    def run_forever():
+        logger.info("Outbox job runner started")
+        while True:
+            try:
+                done = JobQueue.drain()
+                if done:
+                    logger.info(f"Outbox jobs done: {done}")
+            except Exception as e:
+                logger.warning(f"Outbox drain failed: {e}")
+            time.sleep(settings.JOBS_POLL_INTERVAL)
+
+
+# =======================
+# 任务定义 (可重复执行：执行结果与 "标记完成" 同一事务，另外各自检查是否已生效)
+# =======================
+@job("submission_approved")
+def _submission_approved(db: Session, payload: dict):
+    """审核通过后的 勋章计数 + 上级提成；payload: {"approved": {user_id: 数量}, "commissions": [credit]}"""
+    from app.services.badge_service import BadgeService
+    from app.services.ledger_service import LedgerService
+    approved = {int(uid): n for uid, n in (payload.get("approved") or {}).items()}
+    if approved:
+        BadgeService.record(db, {uid: {"approved_count": n} for uid, n in approved.items()})
+    credits = payload.get("commissions") or []
+    if credits:
+        L = models.LedgerEntry
+        paid = set(db.query(L.user_id, L.ref_id).filter(L.biz_type == "commission", L.ref_id.in_([c["ref_id"] for c in credits])).all())
+        credits = [dict(c, biz_type="commission") for c in credits if (c["user_id"], c["ref_id"]) not in paid]
+        LedgerService.credit_many(db, credits)
+
+
+@job("screen_submission")
+def _screen_submission(db: Session, payload: dict):
+    """提交截图的感知哈希近似查重 + 写指纹 (MD5 精确查重仍在提交接口内同步完成)"""
+    from app.services.risk_control import RiskControlService
+    from app.services.stats_service import StatsService
+    from app.services.notification_service import NotificationService
+    S = models.Submission
+    sub = db.query(S).filter(S.id == payload["submission_id"]).with_for_update().first()
+    # 已审核或已重新提交了别的截图：本任务作废
+    if sub is None or sub.status != "pending" or sub.image_hash != payload["md5"]:
+        return
+    phash = RiskControlService.calculate_phash(payload["path"])
+    if not phash:
+        return
+    if RiskControlService.find_similar_image(db, phash, exclude_submission_id=sub.id):
+        sub.status = "rejected"
+        sub.admin_feedback = "系统检测到相似截图"
+        StatsService.submission_status_changed(db, "pending", "rejected")
+        NotificationService.send(db, sub.user_id, "任务提交未通过", "❌ 系统检测到相似截图，请勿作弊！", "task")
+        return
+    fp = models.ImageFingerprint
+    if not db.query(fp.id).filter(fp.submission_id == sub.id, fp.phash == phash).first():
+        RiskControlService.record_fingerprint(db, sub.id, phash)
+
+
+@job("render_poster")
+def _render_poster(db: Session, payload: dict):
+    """预渲染邀请海报到磁盘缓存，用户第一次打开邀请页时直接命中"""
+    from app.services.poster_service import PosterService
+    PosterService.generate_poster(payload["user_id"], payload["username"], payload["base_url"])
+
+
+if __name__ == "__main__":
+    JobQueue.run_forever()
@@ -0,0 +1,136 @@
+import json
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app import models
+from app.database import redis_conn, redis_sync, on_commit
+
+# 计入收入榜的流水类型
+INCOME_BIZ_TYPES = ("task_reward", "commission", "checkin")
+
+
+class Leaderboard:
+    """
+    Redis 有序集合排行榜
+    - rich：all 窗口为当前余额 (ZADD 覆盖)，day / week 窗口为该时段收入 (ZINCRBY 累加)
+    - work：提交任务数，day / week / all 三个窗口都 ZINCRBY 累加
+    - 所有写入都挂在事务提交后执行；读取 Top N / 我的排名都是 O(log n)
+    - 头像昵称单独存 rank:profile 哈希，展示榜单不需要查库
+    """
+    BOARDS = ("rich", "work")
+    WINDOWS = ("day", "week", "all")
+    PROFILE_KEY = "rank:profile"
+    DAY_TTL = 3 * 86400
+    WEEK_TTL = 15 * 86400
+
+    @staticmethod
+    def key(board: str, window: str, now: Optional[datetime] = None) -> str:
+        now = now or datetime.now()
+        if window == "day":
+            return f"rank:{board}:d:{now.strftime('%Y%m%d')}"
+        if window == "week":
+            year, week, _ = now.isocalendar()
+            return f"rank:{board}:w:{year}{week:02d}"
+        return f"rank:{board}:all"
+
+    # ---------- 写入 (事务提交后执行) ----------
+    @staticmethod
+    def _profile(user: models.User) -> str:
+        return json.dumps({"username": user.username, "avatar": user.avatar}, ensure_ascii=False)
+
+    @staticmethod
+    def on_balance_change(db, user: models.User, amount: float, biz_type: str):
+        """LedgerService.change_balance 调用"""
+        income = {user.id: amount} if amount > 0 and biz_type in INCOME_BIZ_TYPES else {}
+        Leaderboard.on_balances_changed(db, [(user.id, user.username, user.avatar, user.balance)], income)
+
+    @staticmethod
+    def on_balances_changed(db, rows, incomes: dict):
+        """
+        批量入账调用 (LedgerService.credit_many)，所有用户合并为一次 pipeline
+        rows: [(user_id, username, avatar, 变动后余额)]；incomes: {user_id: 本次计入收入榜的金额}
+        """
+        snapshot = [
+            (uid, balance, json.dumps({"username": username, "avatar": avatar}, ensure_ascii=False))
+            for uid, username, avatar, balance in rows
+        ]
+
+        def apply():
+            pipe = redis_sync.pipeline(transaction=False)
+            for user_id, balance, profile in snapshot:
+                pipe.zadd(Leaderboard.key("rich", "all"), {user_id: balance})
+                pipe.hset(Leaderboard.PROFILE_KEY, user_id, profile)
+            if incomes:
+                for window, ttl in (("day", Leaderboard.DAY_TTL), ("week", Leaderboard.WEEK_TTL)):
+                    k = Leaderboard.key("rich", window)
+                    for user_id, amount in incomes.items():
+                        pipe.zincrby(k, amount, user_id)
+                    pipe.expire(k, ttl)
+            pipe.execute()
+        on_commit(db, apply)
+
+    @staticmethod
+    def on_submission(db, user_id: int):
+        """新建 Submission 时调用 (抢单 / 直接提交)"""
+        def apply():
+            pipe = redis_sync.pipeline(transaction=False)
+            pipe.zincrby(Leaderboard.key("work", "all"), 1, user_id)
+            for window, ttl in (("day", Leaderboard.DAY_TTL), ("week", Leaderboard.WEEK_TTL)):
+                k = Leaderboard.key("work", window)
+                pipe.zincrby(k, 1, user_id)
+                pipe.expire(k, ttl)
+            pipe.execute()
+        on_commit(db, apply)
+
+    @staticmethod
+    def touch_profile(db, user: models.User):
+        """头像等展示信息变化时调用"""
+        user_id, profile = user.id, Leaderboard._profile(user)
+        on_commit(db, lambda: redis_sync.hset(Leaderboard.PROFILE_KEY, user_id, profile))
+
+    # ---------- 读取 ----------
+    @staticmethod
+    async def top(board: str, window: str = "all", n: int = 10) -> List[dict]:
+        rows = await redis_conn.zrevrange(Leaderboard.key(board, window), 0, n - 1, withscores=True)
+        if not rows:
+            return []
+        profiles = await redis_conn.hmget(Leaderboard.PROFILE_KEY, [uid for uid, _ in rows])
+        result = []
+        for (uid, score), raw in zip(rows, profiles):
+            profile = json.loads(raw) if raw else {"username": f"用户{uid}", "avatar": None}
+            result.append({"user_id": int(uid), "username": profile["username"], "avatar": profile["avatar"], "score": score})
+        return result
+
+    @staticmethod
+    async def my_rank(board: str, window: str, user_id: int) -> Optional[dict]:
+        """返回 {"rank": 名次(从 1 开始), "score": 分数}，未上榜返回 None"""
+        key = Leaderboard.key(board, window)
+        rank = await redis_conn.zrevrank(key, user_id)
+        if rank is None:
+            return None
+        return {"rank": rank + 1, "score": await redis_conn.zscore(key, user_id)}
+
+    # ---------- 全量重建 ----------
+    @staticmethod
+    def rebuild(db: Session):
+        """首次上线或数据修复时按数据库重建 all 窗口 (day / week 窗口自然滚动生成)"""
+        pipe = redis_sync.pipeline(transaction=True)
+        pipe.delete(Leaderboard.key("rich", "all"), Leaderboard.key("work", "all"))
+        for u in db.query(models.User.id, models.User.username, models.User.avatar, models.User.balance).yield_per(5000):
+            pipe.zadd(Leaderboard.key("rich", "all"), {u.id: u.balance or 0})
+            pipe.hset(Leaderboard.PROFILE_KEY, u.id, json.dumps({"username": u.username, "avatar": u.avatar}, ensure_ascii=False))
+        counts = db.query(models.Submission.user_id, func.count(models.Submission.id)).group_by(models.Submission.user_id)
+        for user_id, cnt in counts:
+            pipe.zadd(Leaderboard.key("work", "all"), {user_id: cnt})
+        pipe.execute()
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    session = SessionLocal()
+    try:
+        Leaderboard.rebuild(session)
+        print("✅ Leaderboards rebuilt")
+    finally:
+        session.close()
@@ -0,0 +1,156 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import case, func, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from app import models
+from app.core.user_cache import UserCache
+from app.services.badge_service import BadgeService, EARNING_BIZ_TYPES
+from app.services.leaderboard import Leaderboard, INCOME_BIZ_TYPES
+from app.services.stats_service import StatsService
+
+
+class LedgerService:
+    """
+    统一资金流水
+    - change_balance 是唯一的余额变动入口：UPDATE 增量改余额 + 读回新余额追加一条流水，不 commit，随调用方事务提交
+    - credit_many 是批量版本 (批量审核)：按用户汇总后一条 UPDATE 改余额，流水 bulk insert
+    - 账单页按 (user_id, id) 索引倒序游标分页，成本与用户流水总数无关
+    """
+    PAGE_SIZE = 20
+
+    @staticmethod
+    def change_balance(
+        db: Session, user: models.User, amount: float, biz_type: str, title: str,
+        ref_id: Optional[int] = None, entry_type: Optional[str] = None
+    ) -> models.LedgerEntry:
+        # 在 SQL 里做增量，不用 Python 里可能已过期的 user.balance 覆盖并发的入账 (如批量审核的 credit_many)
+        User = models.User
+        db.execute(
+            update(User).where(User.id == user.id)
+            .values(balance=func.coalesce(User.balance, 0) + amount)
+            .execution_options(synchronize_session=False)
+        )
+        set_committed_value(user, "balance", db.query(User.balance).filter(User.id == user.id).scalar())
+        UserCache.mark_dirty(db, user.id)
+        if entry_type is None:
+            entry_type = "income" if amount >= 0 else "expense"
+        entry = models.LedgerEntry(
+            user_id=user.id, type=entry_type, biz_type=biz_type, title=title,
+            amount=amount, balance_after=user.balance, ref_id=ref_id
+        )
+        db.add(entry)
+        Leaderboard.on_balance_change(db, user, amount, biz_type)
+        if amount > 0 and biz_type in EARNING_BIZ_TYPES:
+            BadgeService.record(db, {user.id: {"lifetime_earnings": amount}})
+        if biz_type in ("task_reward", "commission"):
+            StatsService.incr_daily(db, "payout", amount)
+        return entry
+
+    @staticmethod
+    def credit_many(db: Session, credits: List[dict]) -> int:
+        """
+        批量变动余额，不 commit；返回写入的流水条数
+        credits: [{"user_id", "amount", "biz_type", "title", "ref_id"}]，列表顺序即流水顺序
+        余额用 UPDATE users SET balance = balance + CASE id ... END 一次完成，
+        再读回最新余额倒推每条流水的 balance_after
+        """
+        if not credits:
+            return 0
+        totals = defaultdict(float)
+        for c in credits:
+            totals[c["user_id"]] += c["amount"]
+        user_ids = list(totals)
+
+        User = models.User
+        db.execute(
+            update(User).where(User.id.in_(user_ids))
+            .values(balance=func.coalesce(User.balance, 0) + case(dict(totals), value=User.id, else_=0))
+            .execution_options(synchronize_session=False)
+        )
+        rows = db.query(User.id, User.username, User.avatar, User.balance).filter(User.id.in_(user_ids)).all()
+
+        running = {r.id: r.balance for r in rows}
+        entries = []
+        for c in reversed(credits):
+            uid = c["user_id"]
+            if uid not in running:  # 用户已不存在
+                continue
+            entries.append(dict(
+                user_id=uid, type=c.get("entry_type") or ("income" if c["amount"] >= 0 else "expense"),
+                biz_type=c["biz_type"], title=c["title"], amount=c["amount"],
+                balance_after=running[uid], ref_id=c.get("ref_id")
+            ))
+            running[uid] -= c["amount"]
+        entries.reverse()
+        db.bulk_insert_mappings(models.LedgerEntry, entries)
+
+        incomes, payout = defaultdict(float), 0.0
+        for e in entries:
+            if e["amount"] > 0 and e["biz_type"] in INCOME_BIZ_TYPES:
+                incomes[e["user_id"]] += e["amount"]
+            if e["biz_type"] in ("task_reward", "commission"):
+                payout += e["amount"]
+        for r in rows:
+            UserCache.mark_dirty(db, r.id)
+        Leaderboard.on_balances_changed(db, rows, dict(incomes))
+        BadgeService.record(db, {uid: {"lifetime_earnings": amount} for uid, amount in incomes.items()})
+        if payout:
+            StatsService.incr_daily(db, "payout", payout)
+        return len(entries)
+
+    @staticmethod
+    def list_entries(db: Session, user_id: int, cursor: Optional[int] = None, limit: int = PAGE_SIZE) -> Tuple[List[models.LedgerEntry], Optional[int]]:
+        """返回 (本页流水, 下一页游标)；cursor 为上一页最后一条的 id"""
+        query = db.query(models.LedgerEntry).filter(models.LedgerEntry.user_id == user_id)
+        if cursor:
+            query = query.filter(models.LedgerEntry.id < cursor)
+        rows = query.order_by(models.LedgerEntry.id.desc()).limit(limit + 1).all()
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    @staticmethod
+    def backfill(db: Session):
+        """
+        上线前的历史数据迁移：从 提交 / 提现 / 充值 / VIP 日志 生成流水 (只处理还没有流水的用户)
+        历史记录没有当时余额，balance_after 留空
+        """
+        import re
+        has_ledger = db.query(models.LedgerEntry.user_id).distinct()
+        entries = []
+
+        subs = db.query(models.Submission, models.Task.title).join(models.Task, models.Task.id == models.Submission.task_id)\
+            .filter(models.Submission.status == "approved", models.Submission.user_id.notin_(has_ledger)).all()
+        for s, task_title in subs:
+            entries.append(dict(user_id=s.user_id, type="income", biz_type="task_reward", title=f"任务奖励: {task_title}", amount=s.final_amount, ref_id=s.id, created_at=s.created_at))
+
+        for w in db.query(models.Withdrawal).filter(models.Withdrawal.user_id.notin_(has_ledger)).all():
+            entries.append(dict(user_id=w.user_id, type="expense", biz_type="withdraw", title="提现申请", amount=-w.amount, ref_id=w.id, created_at=w.created_at))
+            if w.status == "rejected":
+                entries.append(dict(user_id=w.user_id, type="refund", biz_type="withdraw_refund", title="提现驳回 (退款)", amount=w.amount, ref_id=w.id, created_at=w.created_at))
+
+        for d in db.query(models.Deposit).filter(models.Deposit.status == "approved", models.Deposit.user_id.notin_(has_ledger)).all():
+            entries.append(dict(user_id=d.user_id, type="income", biz_type="deposit", title="余额充值", amount=d.amount, ref_id=d.id, created_at=d.created_at))
+
+        logs = db.query(models.AuditLog).filter(models.AuditLog.action == "buy_vip", models.AuditLog.operator_id.notin_(has_ledger)).all()
+        for l in logs:
+            match = re.search(r"花费 (\d+(\.\d+)?) 元", l.detail or "")
+            cost = float(match.group(1)) if match else 0
+            entries.append(dict(user_id=l.operator_id, type="expense", biz_type="buy_vip", title="购买VIP会员", amount=-cost, created_at=l.created_at))
+
+        # 按时间顺序插入，保证 id 顺序与时间顺序一致
+        entries.sort(key=lambda e: e["created_at"] or datetime.min)
+        if entries:
+            db.bulk_insert_mappings(models.LedgerEntry, entries)
+        db.commit()
+        return len(entries)
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    session = SessionLocal()
+    try:
+        print(f"✅ Ledger backfilled: {LedgerService.backfill(session)} entries")
+    finally:
+        session.close()
@@ -0,0 +1,171 @@
+import asyncio
+from datetime import datetime
+from typing import Iterable, List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.database import redis_conn, redis_sync
+from app.core.logger import logger
+
+
+class MaterialPool:
+    """
+    素材库存池：每个素材分类在 Redis 中维护一个可用素材 ID 列表
+    - 抢单时 LPOP 原子领取，不再需要按任务加锁，也不再 SELECT ... FOR UPDATE
+    - 领取后用条件 UPDATE (status='unused') 落库，池子里残留的脏 ID (已删除/已移动) 会被跳过
+    - reconcile 以 materials 表为准重建池子：beat 每 10 分钟执行一次 (补回提交后 push 失败的素材)，运维也可手动执行
+    """
+    MAX_SKIP = 20  # 单次领取最多跳过的脏 ID 数
+    LOAD_WAIT = 2.0  # 冷启动时等待其它 worker 装载池子的最长时间 (秒)
+
+    @staticmethod
+    def pool_key(cat_id: int) -> str:
+        return f"material_pool:{cat_id}"
+
+    @staticmethod
+    def loaded_key(cat_id: int) -> str:
+        return f"material_pool:{cat_id}:loaded"
+
+    # ---------- 写入 ----------
+    @staticmethod
+    async def push(cat_id: int, material_ids: Iterable[int]):
+        """新素材入库 / 移入分类 / 释放素材后调用 (需在 DB commit 之后)"""
+        ids = list(material_ids)
+        if not ids:
+            return
+        try:
+            await redis_conn.rpush(MaterialPool.pool_key(cat_id), *ids)
+        except Exception as e:
+            logger.warning(f"Material pool push failed (cat {cat_id}): {e}")
+
+    # ---------- 重建 ----------
+    @staticmethod
+    def _available_stmt(cat_id: int):
+        return select(models.Material.id).where(
+            models.Material.category_id == cat_id,
+            models.Material.status == "unused",
+            models.Material.is_deleted == False
+        ).order_by(models.Material.id)
+
+    @staticmethod
+    async def _replace_pool(cat_id: int, ids: List[int]):
+        key = MaterialPool.pool_key(cat_id)
+        async with redis_conn.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            if ids:
+                pipe.rpush(key, *ids)
+            pipe.set(MaterialPool.loaded_key(cat_id), "1")
+            await pipe.execute()
+
+    @staticmethod
+    def reconcile(db: Session, cat_id: int) -> int:
+        """以数据库为准重建某分类的库存池，返回可用数量 (同步版本，给定时任务 / 命令行用)"""
+        ids = list(db.execute(MaterialPool._available_stmt(cat_id)).scalars())
+        key = MaterialPool.pool_key(cat_id)
+        pipe = redis_sync.pipeline(transaction=True)
+        pipe.delete(key)
+        if ids:
+            pipe.rpush(key, *ids)
+        pipe.set(MaterialPool.loaded_key(cat_id), "1")
+        pipe.execute()
+        return len(ids)
+
+    @staticmethod
+    async def reconcile_async(db: AsyncSession, cat_id: int) -> int:
+        ids = list((await db.execute(MaterialPool._available_stmt(cat_id))).scalars())
+        await MaterialPool._replace_pool(cat_id, ids)
+        return len(ids)
+
+    @staticmethod
+    async def reconcile_all_async(db: AsyncSession) -> dict:
+        result = {}
+        for cat_id in (await db.execute(select(models.MaterialCategory.id))).scalars().all():
+            result[cat_id] = await MaterialPool.reconcile_async(db, cat_id)
+        return result
+
+    @staticmethod
+    def reconcile_all(db: Session) -> dict:
+        result = {}
+        for cat_id, in db.query(models.MaterialCategory.id).all():
+            result[cat_id] = MaterialPool.reconcile(db, cat_id)
+        return result
+
+    # ---------- 领取 ----------
+    @staticmethod
+    async def claim(db: AsyncSession, cat_id: int, user_id: int) -> Optional[int]:
+        """
+        原子领取一个素材并落库为 locked，返回素材 ID；库存为空返回 None
+        不 commit，由调用方与 Submission 一起提交；提交失败时调用方需 release
+        """
+        key = MaterialPool.pool_key(cat_id)
+        if not await MaterialPool._ensure_loaded(db, cat_id):
+            # 装载超时 (装载者失败或太慢)：直接从数据库领取，不因池子没准备好返回 "手慢了"
+            return await MaterialPool._claim_from_db(db, cat_id, user_id)
+
+        for _ in range(MaterialPool.MAX_SKIP):
+            mat_id = await redis_conn.lpop(key)
+            if mat_id is None:
+                return None
+            if await MaterialPool._lock(db, cat_id, int(mat_id), user_id):
+                return int(mat_id)
+        return None
+
+    @staticmethod
+    async def _ensure_loaded(db: AsyncSession, cat_id: int) -> bool:
+        """池子已装载返回 True；首次使用时由抢到 SET NX 的 worker 装载，其余请求短暂轮询等待"""
+        loaded = MaterialPool.loaded_key(cat_id)
+        if await redis_conn.exists(loaded):
+            return True
+        if await redis_conn.set(f"lock:material_pool:{cat_id}", "1", nx=True, ex=30):
+            await MaterialPool.reconcile_async(db, cat_id)
+            return True
+        deadline = asyncio.get_running_loop().time() + MaterialPool.LOAD_WAIT
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.05)
+            if await redis_conn.exists(loaded):
+                return True
+        return False
+
+    @staticmethod
+    async def _lock(db: AsyncSession, cat_id: int, mat_id: int, user_id: int) -> bool:
+        """条件 UPDATE 把素材标记为 locked，已被领取 / 删除 / 移走时返回 False"""
+        M = models.Material
+        result = await db.execute(
+            update(M).where(M.id == mat_id, M.category_id == cat_id, M.status == "unused", M.is_deleted == False)
+            .values(status="locked", used_by_user_id=user_id, used_at=datetime.now())
+        )
+        if not result.rowcount:
+            return False
+        await db.execute(
+            update(models.MaterialCategory).where(models.MaterialCategory.id == cat_id)
+            .values(used_count=models.MaterialCategory.used_count + 1)
+        )
+        return True
+
+    @staticmethod
+    async def _claim_from_db(db: AsyncSession, cat_id: int, user_id: int) -> Optional[int]:
+        """不经过 Redis 的兜底领取：SKIP LOCKED 取一条可用素材再条件 UPDATE"""
+        for _ in range(MaterialPool.MAX_SKIP):
+            mat_id = (await db.execute(
+                MaterialPool._available_stmt(cat_id).limit(1).with_for_update(skip_locked=True)
+            )).scalar()
+            if mat_id is None:
+                return None
+            if await MaterialPool._lock(db, cat_id, mat_id, user_id):
+                return mat_id
+        return None
+
+    @staticmethod
+    async def release(cat_id: int, material_id: int):
+        """领取后事务失败，把素材放回池子"""
+        await MaterialPool.push(cat_id, [material_id])
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    session = SessionLocal()
+    try:
+        print(f"✅ Material pools rebuilt: {MaterialPool.reconcile_all(session)}")
+    finally:
+        session.close()
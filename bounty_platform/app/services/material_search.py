@@ -0,0 +1,187 @@
+import re
+from typing import Iterable, List, Optional, Set, Tuple
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session, aliased
+from app import models
+
+# 连续的英文 / 数字 / 中文算一段，段内按相邻两字切分
+_RUN = re.compile(r"[a-z0-9\u4e00-\u9fff]+")
+# 正文只取前 N 个字参与索引，超长文案不至于撑爆倒排表
+MAX_TEXT = 2000
+# 估算总数时每个词最多数到这么多行，计数成本有上限
+COUNT_CAP = 10000
+
+
+def runs(text: Optional[str]) -> List[str]:
+    """按段切分 (转小写)，符号 / 空格为分隔"""
+    return _RUN.findall(text.lower()) if text else []
+
+
+def tokenize(text: Optional[str]) -> Set[str]:
+    """
+    每段按相邻两字切分 (不区分中英文，"Python3教程" → py / yt / ... / 3教 / 教程)，只有一个字的段单独成词
+    任意 >= 2 字的子串的二元组都在索引里，"thon" 这类词中片段也能命中，与原来的 LIKE 一致
+    """
+    terms = set()
+    for run in runs(text):
+        if len(run) == 1:
+            terms.add(run)
+        else:
+            terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def _query_terms(query_runs: List[str]) -> List[str]:
+    """查询用的二元组；单字段切不出二元组 (文中 "红" 可能只出现在 "红包" 里)，交给回表的 LIKE 校验"""
+    return sorted({run[i:i + 2] for run in query_runs if len(run) >= 2 for i in range(len(run) - 1)})
+
+
+def _contains_all(query_runs: List[str]):
+    """每段都要作为子串出现在标题或正文里：二元组都命中不代表相邻，用它过滤掉误命中"""
+    M = models.Material
+    return and_(*[or_(M.title.contains(r), M.content.contains(r)) for r in query_runs])
+
+
+class MaterialSearchService:
+    """
+    素材库搜索 / 浏览
+    - material_terms 是 标题 + 正文 的倒排索引，只保存未删除的素材：上传写入，删除移除，移动改分类
+    - 搜索 = 每个二元组一张别名按 material_id 自连接 (AND 语义)，再回表用 LIKE 校验每段关键词确实连续出现，
+      按 material_id 倒序游标分页，每页只扫描命中的索引行，与素材总量无关；SQLite / MySQL 通用，不依赖 ngram 分词插件
+    - 关键词只有单字段 (如 "红") 时切不出二元组，退回 LIKE
+    - 浏览走 (category_id, is_deleted, id) 索引做游标分页，不再一次返回整个分类
+    - 总数只给估算值：浏览取分类计数，搜索取最稀有词的命中数 (封顶 COUNT_CAP)，只在第一页计算
+    """
+
+    # ---------- 索引维护 (不 commit，随调用方事务提交) ----------
+    @staticmethod
+    def index_values(db: Session, values: Iterable[Tuple[int, int, Optional[str], Optional[str]]]):
+        """values 为 (material_id, category_id, title, content)，批量导入不建 ORM 对象时使用"""
+        rows = []
+        for material_id, category_id, title, content in values:
+            for term in tokenize(f"{title or ''}\n{(content or '')[:MAX_TEXT]}"):
+                rows.append({"term": term, "category_id": category_id, "material_id": material_id})
+        if rows:
+            db.bulk_insert_mappings(models.MaterialTerm, rows)
+
+    @staticmethod
+    def index_materials(db: Session, mats: Iterable[models.Material]):
+        """新素材 flush 拿到 id 后调用"""
+        MaterialSearchService.index_values(db, [(m.id, m.category_id, m.title, m.content) for m in mats])
+
+    @staticmethod
+    def remove(db: Session, material_ids: List[int]):
+        if material_ids:
+            db.query(models.MaterialTerm).filter(models.MaterialTerm.material_id.in_(material_ids)).delete(synchronize_session=False)
+
+    @staticmethod
+    def move(db: Session, material_ids: List[int], category_id: int):
+        if material_ids:
+            db.query(models.MaterialTerm).filter(models.MaterialTerm.material_id.in_(material_ids)).update(
+                {models.MaterialTerm.category_id: category_id}, synchronize_session=False
+            )
+
+    # ---------- 查询语句 (同步 / 异步 Session 共用) ----------
+    @staticmethod
+    def search_ids_stmt(terms: List[str], query_runs: List[str], cat_id: int, cursor: Optional[int], limit: int):
+        M = models.Material
+        first = aliased(models.MaterialTerm)
+        stmt = select(first.material_id).where(first.term == terms[0])
+        if cat_id > 0:
+            stmt = stmt.where(first.category_id == cat_id)
+        for term in terms[1:]:
+            t = aliased(models.MaterialTerm)
+            stmt = stmt.join(t, (t.material_id == first.material_id) & (t.term == term))
+        stmt = stmt.join(M, M.id == first.material_id).where(M.is_deleted == False, _contains_all(query_runs))
+        if cursor:
+            stmt = stmt.where(first.material_id < cursor)
+        return stmt.order_by(first.material_id.desc()).limit(limit)
+
+    @staticmethod
+    def browse_stmt(cat_id: int, cursor: Optional[int], limit: int, keyword: Optional[str] = None):
+        M = models.Material
+        stmt = select(M).where(M.is_deleted == False)
+        if cat_id > 0:
+            stmt = stmt.where(M.category_id == cat_id)
+        if keyword:  # 关键词切不出二元组 (单字 / 纯符号) 时退回 LIKE
+            query_runs = runs(keyword)
+            stmt = stmt.where(_contains_all(query_runs) if query_runs else M.title.contains(keyword, autoescape=True))
+        if cursor:
+            stmt = stmt.where(M.id < cursor)
+        return stmt.order_by(M.id.desc()).limit(limit)
+
+    @staticmethod
+    def term_count_stmt(term: str, cat_id: int):
+        T = models.MaterialTerm
+        sub = select(T.id).where(T.term == term)
+        if cat_id > 0:
+            sub = sub.where(T.category_id == cat_id)
+        return select(func.count()).select_from(sub.limit(COUNT_CAP).subquery())
+
+    @staticmethod
+    def category_count_stmt(cat_id: int):
+        C = models.MaterialCategory
+        stmt = select(func.coalesce(func.sum(C.total_count), 0))
+        return stmt.where(C.id == cat_id) if cat_id > 0 else stmt
+
+    # ---------- 异步入口 ----------
+    @staticmethod
+    async def page(db, cat_id: int, keyword: Optional[str], cursor: Optional[int], limit: int) -> dict:
+        """返回 {"items": [Material], "next_cursor", "total_estimate", "estimate_exact"}"""
+        keyword = (keyword or "").strip()
+        query_runs = runs(keyword)
+        terms = _query_terms(query_runs)
+        estimate, exact = None, False
+        if terms:
+            if not cursor:
+                counts = [(await db.execute(MaterialSearchService.term_count_stmt(t, cat_id))).scalar() for t in terms]
+                estimate = min(counts)
+                # 只有一个两字关键词时索引命中数就是结果数
+                exact = query_runs == terms and estimate < COUNT_CAP
+                # 最稀有的词放在最前面驱动连接
+                terms = [t for _, t in sorted(zip(counts, terms))]
+                if estimate == 0:
+                    return {"items": [], "next_cursor": None, "total_estimate": 0, "estimate_exact": True}
+            ids = (await db.execute(MaterialSearchService.search_ids_stmt(terms, query_runs, cat_id, cursor, limit + 1))).scalars().all()
+            more = len(ids) > limit
+            ids = ids[:limit]
+            mats = []
+            if ids:
+                M = models.Material
+                found = (await db.execute(select(M).where(M.id.in_(ids), M.is_deleted == False))).scalars().all()
+                by_id = {m.id: m for m in found}
+                mats = [by_id[i] for i in ids if i in by_id]
+            next_cursor = ids[-1] if more else None
+        else:
+            if not cursor:
+                estimate = (await db.execute(MaterialSearchService.category_count_stmt(cat_id))).scalar()
+            mats = (await db.execute(MaterialSearchService.browse_stmt(cat_id, cursor, limit + 1, keyword))).scalars().all()
+            more = len(mats) > limit
+            mats = mats[:limit]
+            next_cursor = mats[-1].id if more else None
+        return {"items": mats, "next_cursor": next_cursor, "total_estimate": estimate, "estimate_exact": exact}
+
+    # ---------- 全量重建 ----------
+    @staticmethod
+    def rebuild(db: Session):
+        """根据 materials 全量重建索引 (首次上线或数据修复时执行)"""
+        db.query(models.MaterialTerm).delete(synchronize_session=False)
+        M = models.Material
+        last = 0
+        while True:
+            batch = db.query(M).filter(M.is_deleted == False, M.id > last).order_by(M.id).limit(500).all()
+            if not batch:
+                break
+            MaterialSearchService.index_materials(db, batch)
+            last = batch[-1].id
+        db.commit()
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    session = SessionLocal()
+    try:
+        MaterialSearchService.rebuild(session)
+        print("✅ Material search index rebuilt")
+    finally:
+        session.close()
@@ -0,0 +1,200 @@
+import csv
+import hashlib
+import io
+import os
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import case, func, or_
+from sqlalchemy.orm import Session
+from app import models
+from app.core.config import settings
+from app.services.material_search import MaterialSearchService
+from app.services.risk_control import save_stream_with_hash
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+MANIFEST_NAME = "manifest.csv"
+
+
+class MaterialEntry(NamedTuple):
+    """待入库的一条素材：多张图片即轮播贴"""
+    title: str
+    content: str
+    paths: List[str]
+    md5s: List[str]
+
+
+class MaterialService:
+    """
+    素材批量写入 / 删除 / 移动
+    - 入库按 content_hash (单图即图片 MD5) 去重：同批次内去重 + 与库中未删除素材去重
+    - 行数据分块批量 INSERT，再按 content_hash 取回 id 写搜索索引、补库存池 (MySQL 不支持 RETURNING)
+    - 分类计数一律按分类分组后一条 UPDATE ... CASE 调整，不再逐条查询分类
+    - 均不 commit，随调用方事务提交
+    """
+    CHUNK = 500
+
+    @staticmethod
+    def content_hash(md5s: List[str]) -> str:
+        if len(md5s) == 1:
+            return md5s[0]
+        return hashlib.md5("|".join(md5s).encode("ascii")).hexdigest()
+
+    # ---------- 分类计数 ----------
+    @staticmethod
+    def adjust_counts(db: Session, deltas: Dict[int, int]):
+        """deltas: {分类ID: 增减数量}，计数不会减到负数"""
+        deltas = {cid: n for cid, n in deltas.items() if cid and n}
+        if not deltas:
+            return
+        C = models.MaterialCategory
+        new_count = func.coalesce(C.total_count, 0) + case(deltas, value=C.id, else_=0)
+        db.query(C).filter(C.id.in_(list(deltas))).update(
+            {C.total_count: case((new_count > 0, new_count), else_=0)}, synchronize_session=False
+        )
+
+    # ---------- 写入 ----------
+    @staticmethod
+    def create_many(db: Session, cat_id: int, entries: List[MaterialEntry]) -> Tuple[List[int], int]:
+        """批量入库，返回 (新素材 ID 列表, 跳过的重复数)"""
+        M = models.Material
+        by_hash = {}
+        for e in entries:
+            by_hash.setdefault(MaterialService.content_hash(e.md5s), e)
+        duplicates = len(entries) - len(by_hash)
+
+        hashes = list(by_hash)
+        for i in range(0, len(hashes), MaterialService.CHUNK):
+            chunk = hashes[i:i + MaterialService.CHUNK]
+            for (h,) in db.query(M.content_hash).filter(M.content_hash.in_(chunk), M.is_deleted == False):
+                if by_hash.pop(h, None) is not None:
+                    duplicates += 1
+
+        now = datetime.now()
+        rows = [{
+            "category_id": cat_id, "title": e.title, "content": e.content, "images": e.paths,
+            "status": "unused", "is_deleted": False, "created_at": now, "content_hash": h,
+        } for h, e in by_hash.items()]
+        new_ids = []
+        for i in range(0, len(rows), MaterialService.CHUNK):
+            chunk = rows[i:i + MaterialService.CHUNK]
+            db.bulk_insert_mappings(M, chunk)
+            found = db.query(M.id, M.content_hash).filter(
+                M.content_hash.in_([r["content_hash"] for r in chunk]),
+                M.category_id == cat_id,
+                M.is_deleted == False
+            ).all()
+            ids = {h: mid for mid, h in found}
+            MaterialSearchService.index_values(db, [(ids[r["content_hash"]], cat_id, r["title"], r["content"]) for r in chunk])
+            new_ids.extend(ids[r["content_hash"]] for r in chunk)
+        MaterialService.adjust_counts(db, {cat_id: len(new_ids)})
+        return new_ids, duplicates
+
+    # ---------- 批量删除 / 移动 ----------
+    @staticmethod
+    def batch_delete(db: Session, ids: List[int]) -> int:
+        """软删除，返回实际删除数量 (已删除的不重复扣减计数)"""
+        M = models.Material
+        counts = dict(db.query(M.category_id, func.count(M.id)).filter(M.id.in_(ids), M.is_deleted == False).group_by(M.category_id).all())
+        if not counts:
+            return 0
+        db.query(M).filter(M.id.in_(ids), M.is_deleted == False).update(
+            {M.is_deleted: True, M.deleted_at: datetime.now()}, synchronize_session=False
+        )
+        MaterialService.adjust_counts(db, {cid: -n for cid, n in counts.items()})
+        MaterialSearchService.remove(db, ids)
+        return sum(counts.values())
+
+    @staticmethod
+    def batch_move(db: Session, ids: List[int], target_cat_id: int) -> Tuple[int, List[int]]:
+        """返回 (实际移动数量, 需要补进目标库存池的未使用素材 ID)"""
+        M = models.Material
+        rows = db.query(M.id, M.category_id, M.status).filter(
+            M.id.in_(ids), M.is_deleted == False,
+            or_(M.category_id.is_(None), M.category_id != target_cat_id)
+        ).all()
+        if not rows:
+            return 0, []
+        moved = [r.id for r in rows]
+        deltas = Counter()
+        for r in rows:
+            deltas[r.category_id] -= 1
+        deltas[target_cat_id] += len(rows)
+        db.query(M).filter(M.id.in_(moved)).update({M.category_id: target_cat_id}, synchronize_session=False)
+        MaterialService.adjust_counts(db, deltas)
+        MaterialSearchService.move(db, moved, target_cat_id)
+        return len(moved), [r.id for r in rows if r.status == "unused"]
+
+    # ---------- ZIP 导入 ----------
+    @staticmethod
+    def _read_manifest(data: bytes) -> List[Tuple[List[str], str, str]]:
+        """清单 CSV 列：file (多图用 | 分隔，合并为轮播贴), title, content"""
+        reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+        if not reader.fieldnames or "file" not in reader.fieldnames:
+            raise ValueError("清单缺少 file 列")
+        items = []
+        for row in reader:
+            files = [f.strip() for f in (row.get("file") or "").split("|") if f.strip()]
+            if files:
+                title = (row.get("title") or "").strip() or os.path.splitext(os.path.basename(files[0]))[0]
+                items.append((files, title, (row.get("content") or "").strip()))
+        return items
+
+    @staticmethod
+    def import_archive(db: Session, cat_id: int, archive: BinaryIO, manifest: Optional[bytes] = None) -> dict:
+        """
+        ZIP 图片包 (+ CSV 清单，可单独上传或放在包内 manifest.csv) 批量导入
+        没有清单时每张图一条素材，标题取文件名；图片在线程池中并发解压、算哈希、写盘
+        """
+        with zipfile.ZipFile(archive) as zf:
+            images = {}
+            for info in zf.infolist():
+                name = info.filename
+                base = os.path.basename(name)
+                if info.is_dir() or name.startswith("__MACOSX/") or base.startswith("."):
+                    continue
+                if base.lower() == MANIFEST_NAME:
+                    if manifest is None:
+                        manifest = zf.read(info)
+                elif os.path.splitext(base)[1].lower() in IMAGE_EXTS:
+                    images[name] = info
+            if len(images) > settings.MATERIAL_IMPORT_MAX_FILES:
+                raise ValueError(f"图片数量超过上限 {settings.MATERIAL_IMPORT_MAX_FILES}")
+            if sum(i.file_size for i in images.values()) > settings.MATERIAL_IMPORT_MAX_MB * 1024 * 1024:
+                raise ValueError(f"解压后总大小超过 {settings.MATERIAL_IMPORT_MAX_MB}MB")
+
+            if manifest is not None:
+                items = MaterialService._read_manifest(manifest)
+            else:
+                items = [([name], os.path.splitext(os.path.basename(name))[0], "") for name in sorted(images)]
+
+            # 清单里可以只写文件名，不带包内目录
+            by_base = {}
+            for name in images:
+                by_base.setdefault(os.path.basename(name), name)
+            resolve = lambda f: f if f in images else by_base.get(f)
+            wanted = sorted({resolve(f) for files, _, _ in items for f in files} - {None})
+
+            def store(name):
+                with zf.open(images[name]) as f:
+                    return save_stream_with_hash(f, name)
+
+            with ThreadPoolExecutor(max_workers=settings.MATERIAL_IMPORT_WORKERS) as pool:
+                saved = dict(zip(wanted, pool.map(store, wanted)))
+
+        entries, missing, failed = [], 0, 0
+        for files, title, content in items:
+            names = [resolve(f) for f in files]
+            if None in names:
+                missing += 1
+                continue
+            results = [saved[n] for n in names]
+            if any(not path for path, _ in results):
+                failed += 1
+                continue
+            entries.append(MaterialEntry(title, content, [p for p, _ in results], [m for _, m in results]))
+
+        new_ids, duplicates = MaterialService.create_many(db, cat_id, entries)
+        return {"created": len(new_ids), "duplicates": duplicates, "missing": missing, "failed": failed, "ids": new_ids}
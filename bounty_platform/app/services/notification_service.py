@@ -0,0 +1,111 @@
+from collections import Counter
+from typing import Iterable, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.database import redis_conn, redis_sync, on_commit
+from app.core.logger import logger
+
+# 计数器存在时才加减 (不存在说明还没人读过，下次读取时按数据库初始化)，减到 0 为止
+_ADJUST_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local v = redis.call('INCRBY', KEYS[1], ARGV[1])
+if v < 0 then
+    redis.call('SET', KEYS[1], 0, 'KEEPTTL')
+end
+return v
+"""
+
+
+class NotificationService:
+    """
+    站内信
+    - 写入统一走 send / send_many，事务提交后给 Redis 未读计数加一
+    - 收件箱按 id 倒序游标分页；已读用一条 UPDATE 标记 "id <= X 的全部已读"，提交后按影响行数减计数
+    - 未读计数 notify:unread:<uid> 缺失时按数据库 COUNT 一次并缓存，之后个人中心 / 收件箱不再 COUNT
+    """
+    PAGE_SIZE = 20
+    UNREAD_TTL = 7 * 86400
+
+    _adjust_script = None
+
+    @staticmethod
+    def unread_key(user_id: int) -> str:
+        return f"notify:unread:{user_id}"
+
+    # ---------- 计数 ----------
+    @staticmethod
+    def _adjust(deltas: dict):
+        if NotificationService._adjust_script is None:
+            NotificationService._adjust_script = redis_sync.register_script(_ADJUST_SCRIPT)
+        pipe = redis_sync.pipeline(transaction=False)
+        for uid, n in deltas.items():
+            if n:
+                NotificationService._adjust_script(keys=[NotificationService.unread_key(uid)], args=[n], client=pipe)
+        pipe.execute()
+
+    @staticmethod
+    def adjust_unread(db, deltas: dict):
+        """deltas: {user_id: 增减数量}，事务提交后生效"""
+        if deltas:
+            on_commit(db, lambda: NotificationService._adjust(deltas))
+
+    # ---------- 写入 (不 commit，随调用方事务提交) ----------
+    @staticmethod
+    def send(db, user_id: int, title: str, content: str, type: Optional[str] = None) -> models.Notification:
+        n = models.Notification(user_id=user_id, title=title, content=content, type=type)
+        db.add(n)
+        NotificationService.adjust_unread(db, {user_id: 1})
+        return n
+
+    @staticmethod
+    def send_many(db, rows: Iterable[dict]):
+        """rows: [{"user_id", "title", "content", "type"}]，批量插入"""
+        rows = list(rows)
+        if not rows:
+            return
+        db.bulk_insert_mappings(models.Notification, rows)
+        NotificationService.adjust_unread(db, dict(Counter(r["user_id"] for r in rows)))
+
+    # ---------- 收件箱 ----------
+    @staticmethod
+    async def inbox(db: AsyncSession, user_id: int, cursor: Optional[int] = None, limit: int = PAGE_SIZE):
+        """返回 (本页消息, 下一页游标)"""
+        N = models.Notification
+        stmt = select(N).where(N.user_id == user_id)
+        if cursor:
+            stmt = stmt.where(N.id < cursor)
+        items = (await db.execute(stmt.order_by(N.id.desc()).limit(limit + 1))).scalars().all()
+        more = len(items) > limit
+        items = items[:limit]
+        return items, (items[-1].id if more else None)
+
+    @staticmethod
+    async def mark_read(db: AsyncSession, user_id: int, up_to_id: int) -> int:
+        """id <= up_to_id 的未读消息全部标记已读 (一条 UPDATE)，返回影响行数；需调用方 commit"""
+        N = models.Notification
+        result = await db.execute(
+            update(N).where(N.user_id == user_id, N.is_read == False, N.id <= up_to_id)
+            .values(is_read=True).execution_options(synchronize_session=False)
+        )
+        NotificationService.adjust_unread(db, {user_id: -result.rowcount})
+        return result.rowcount
+
+    @staticmethod
+    async def unread_count(db: AsyncSession, user_id: int) -> int:
+        key = NotificationService.unread_key(user_id)
+        try:
+            cached = await redis_conn.get(key)
+            if cached is not None:
+                return max(int(cached), 0)
+        except Exception as e:
+            logger.warning(f"Unread counter unavailable: {e}")
+        N = models.Notification
+        count = (await db.execute(select(func.count(N.id)).where(N.user_id == user_id, N.is_read == False))).scalar()
+        try:
+            await redis_conn.set(key, count, ex=NotificationService.UNREAD_TTL, nx=True)
+        except Exception:
+            pass
+        return count
@@ -0,0 +1,54 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from app.core import security
+from app.core.config import settings
+
+
+class PasswordBusy(Exception):
+    """哈希进程池排队已满"""
+
+
+class PasswordService:
+    """
+    密码哈希 / 校验统一入口 (策略见 core/security.pwd_context)
+    - 在独立进程池中计算，不占用事件循环和请求线程池
+    - 排队数超过 PASSWORD_MAX_PENDING 直接抛 PasswordBusy，撞库洪峰不会拖垮其它接口
+    - verify 返回需要写回的新哈希 (策略升级后登录时透明重算)
+    """
+    _pool: Optional[ProcessPoolExecutor] = None
+    _pending = 0  # 只在事件循环线程里增减
+
+    @staticmethod
+    def _executor() -> ProcessPoolExecutor:
+        if PasswordService._pool is None:
+            PasswordService._pool = ProcessPoolExecutor(max_workers=settings.PASSWORD_WORKERS)
+        return PasswordService._pool
+
+    @staticmethod
+    async def _run(fn, *args):
+        if PasswordService._pending >= settings.PASSWORD_MAX_PENDING:
+            raise PasswordBusy()
+        PasswordService._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(PasswordService._executor(), fn, *args)
+        finally:
+            PasswordService._pending -= 1
+
+    @staticmethod
+    async def verify(password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """返回 (是否正确, 新哈希或 None)"""
+        if not hashed:
+            return False, None
+        return await PasswordService._run(security.verify_and_update, password, hashed)
+
+    @staticmethod
+    async def hash(password: str) -> str:
+        return await PasswordService._run(security.get_password_hash, password)
+
+    @staticmethod
+    def shutdown():
+        if PasswordService._pool is not None:
+            PasswordService._pool.shutdown(wait=False)
+            PasswordService._pool = None
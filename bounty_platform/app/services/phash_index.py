@@ -0,0 +1,181 @@
+import os
+import pickle
+import threading
+import time
+from itertools import combinations
+from typing import List, Optional
+from PIL import Image
+from sqlalchemy.orm import Session
+from app.core.logger import logger
+
+# 64 位 dHash 拆成 4 段 16 位做多索引哈希 (Multi-Index Hashing)
+CHUNKS = 4
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def dhash(file_path: str) -> Optional[int]:
+    """差值哈希：灰度 → 缩放 9x8 → 相邻像素比较，得到 64 位指纹；对重新压缩、缩放、轻微调色不敏感"""
+    try:
+        with Image.open(file_path) as img:
+            pixels = list(img.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    except Exception as e:
+        logger.warning(f"dHash failed for {file_path}: {e}")
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _chunks(h: int) -> List[int]:
+    return [(h >> (i * CHUNK_BITS)) & CHUNK_MASK for i in range(CHUNKS)]
+
+
+def _neighbors(value: int, radius: int):
+    """枚举 16 位段内汉明距离 <= radius 的所有取值"""
+    yield value
+    for r in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), r):
+            v = value
+            for b in bits:
+                v ^= 1 << b
+            yield v
+
+
+class PHashIndex:
+    """
+    截图近似查重索引 (常驻内存 + 文件快照)
+    - 原理：距离 <= N 的两个 64 位哈希，按 4 段切分后至少有一段距离 <= N // 4 (鸽巢原理)
+      因此每段只需探测少量邻近桶，候选集很小，百万级数据下查询仍在毫秒级
+    - 指纹持久化在 image_fingerprints 表 (只追加)，快照记录水位线，启动时加载快照后只需增量补齐
+    - 多 worker 部署时，每次查询前按 id 水位线补齐其他 worker 新写入的记录
+    - 并发事务里小 id 可能晚于大 id 提交，水位线只推进到第一个缺口，缺口之上已入索引的 id 记在 pending 里；
+      缺口超过 GAP_TIMEOUT 秒或落后最新 id 超过 GAP_WINDOW 条，视为回滚留下的空洞跳过
+    """
+    SNAPSHOT_PATH = "app/database/phash_index.bin"
+    SNAPSHOT_EVERY = 1000  # 每新增多少条落一次快照
+    GAP_TIMEOUT = 60
+    GAP_WINDOW = 1000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = [dict() for _ in range(CHUNKS)]  # 段值 -> [(submission_id, hash)]
+        self.watermark = 0       # 该 id 及以下的指纹都已入索引 (或确认为空洞)
+        self.pending = {}        # 水位线之上已入索引的指纹 id -> 首次入索引时间
+        self.loaded = False
+        self.dirty = 0
+
+    # ---------- 写入 ----------
+    def _insert(self, sub_id: int, h: int):
+        for i, c in enumerate(_chunks(h)):
+            self.buckets[i].setdefault(c, []).append((sub_id, h))
+        self.dirty += 1
+
+    def add(self, fp_id: int, sub_id: int, h: int):
+        """本 worker 写入指纹后立即入索引 (fp_id 为 image_fingerprints 主键)，水位线仍由 _catch_up 顺序推进"""
+        with self.lock:
+            if fp_id > self.watermark and fp_id not in self.pending:
+                self._insert(sub_id, h)
+                self.pending[fp_id] = time.time()
+            if self.dirty >= self.SNAPSHOT_EVERY:
+                self._save()
+
+    # ---------- 加载 / 持久化 ----------
+    def _load_snapshot(self):
+        if not os.path.exists(self.SNAPSHOT_PATH):
+            return
+        try:
+            with open(self.SNAPSHOT_PATH, "rb") as f:
+                data = pickle.load(f)
+            self.buckets, self.watermark, self.pending = data["buckets"], data["watermark"], data["pending"]
+        except Exception as e:
+            logger.warning(f"pHash snapshot load failed, rebuilding: {e}")
+            self.buckets, self.watermark, self.pending = [dict() for _ in range(CHUNKS)], 0, {}
+
+    def _save(self):
+        tmp = self.SNAPSHOT_PATH + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.SNAPSHOT_PATH), exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump({"buckets": self.buckets, "watermark": self.watermark, "pending": self.pending}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.SNAPSHOT_PATH)
+            self.dirty = 0
+        except Exception as e:
+            logger.warning(f"pHash snapshot save failed: {e}")
+
+    def _catch_up(self, db: Session):
+        """按主键水位线增量加载数据库中的新哈希 (水位线之上已入索引的跳过)"""
+        from app.models import ImageFingerprint
+        rows = db.query(ImageFingerprint.id, ImageFingerprint.submission_id, ImageFingerprint.phash).filter(
+            ImageFingerprint.id > self.watermark
+        ).order_by(ImageFingerprint.id).yield_per(5000)
+        now = time.time()
+        for fp_id, sub_id, phash in rows:
+            if fp_id not in self.pending:
+                self._insert(sub_id, int(phash, 16))
+                self.pending[fp_id] = now
+        self._advance(now)
+
+    def _advance(self, now: float):
+        """水位线推进到第一个缺口为止；缺口之后的 id 已等待 GAP_TIMEOUT 秒或落后太多时跳过缺口"""
+        if not self.pending:
+            return
+        top = max(self.pending)
+        for fp_id in sorted(self.pending):
+            if fp_id != self.watermark + 1 and now - self.pending[fp_id] < self.GAP_TIMEOUT and top - fp_id < self.GAP_WINDOW:
+                break
+            del self.pending[fp_id]
+            self.watermark = fp_id
+
+    def sync(self, db: Session):
+        with self.lock:
+            if not self.loaded:
+                self._load_snapshot()
+                self.loaded = True
+            self._catch_up(db)
+            if self.dirty >= self.SNAPSHOT_EVERY:
+                self._save()
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    # ---------- 查询 ----------
+    def search(self, db: Session, h: int, max_distance: int) -> List[int]:
+        """返回与 h 汉明距离 <= max_distance 的 submission id 列表"""
+        self.sync(db)
+        radius = max_distance // CHUNKS
+        found = set()
+        with self.lock:
+            for i, c in enumerate(_chunks(h)):
+                bucket = self.buckets[i]
+                for probe in _neighbors(c, radius):
+                    for sub_id, other in bucket.get(probe, ()):
+                        if sub_id not in found and hamming(h, other) <= max_distance:
+                            found.add(sub_id)
+        return list(found)
+
+
+phash_index = PHashIndex()
+
+
+if __name__ == "__main__":
+    # 全量重建快照：python -m app.services.phash_index
+    from app.database import SessionLocal
+    session = SessionLocal()
+    try:
+        if os.path.exists(PHashIndex.SNAPSHOT_PATH):
+            os.remove(PHashIndex.SNAPSHOT_PATH)
+        phash_index.sync(session)
+        phash_index.save()
+        print(f"✅ pHash index rebuilt, watermark={phash_index.watermark}")
+    finally:
+        session.close()
@@ -1,53 +1,152 @@
+import asyncio
+import hashlib
 import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 import qrcode
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
+from app.core.config import settings
+from app.core.logger import logger
 
-class PosterService:
-    @staticmethod
-    def generate_poster(user_id: int, username: str, base_url: str):
+BG_PATH = "app/static/img/poster_bg.jpg"
+CACHE_DIR = "app/database/posters"
+# 海报版式变化时改这里，旧缓存自动失效 (底图文件变化会自动计入版本)
+LAYOUT_VERSION = "1"
+
+# 进程内模板：底图 + 字体只加载一次 (每个渲染进程各一份)
+_template = {}
+
+
+def _load_template() -> dict:
+    if not _template:
         # 1. 准备底图 (建议放在 static/img/poster_bg.jpg)
-        bg_path = "app/static/img/poster_bg.jpg"
-        if not os.path.exists(bg_path):
-            # 如果没有底图，创建一个纯白底图
-            img = Image.new('RGB', (750, 1334), color='#d00000')
+        if os.path.exists(BG_PATH):
+            bg = Image.open(BG_PATH).convert("RGB")
         else:
-            img = Image.open(bg_path)
-
-        draw = ImageDraw.Draw(img)
-        
-        # 2. 生成二维码
-        invite_url = f"{base_url}/register?invite={user_id}"
-        qr = qrcode.QRCode(box_size=10, border=2)
-        qr.add_data(invite_url)
-        qr.make(fit=True)
-        qr_img = qr.make_image(fill_color="black", back_color="white").resize((200, 200))
-        
-        # 3. 粘贴二维码 (放在底部中间)
-        img_w, img_h = img.size
-        qr_x = (img_w - 200) // 2
-        qr_y = img_h - 300
-        img.paste(qr_img, (qr_x, qr_y))
-        
-        # 4. 绘制文字 (昵称)
+            # 如果没有底图，创建一个纯红底图
+            bg = Image.new('RGB', (750, 1334), color='#d00000')
         # 尝试加载字体，如果没有则使用默认
         try:
-            font = ImageFont.truetype("arial.ttf", 40)
-        except:
+            font = ImageFont.truetype(settings.POSTER_FONT, 40)
+        except Exception:
             font = ImageFont.load_default()
-            
-        text = f"我是 {username}"
-        # 获取文字宽高 (兼容性写法)
+        _template.update(bg=bg, font=font)
+    return _template
+
+
+def template_version() -> str:
+    """版式版本 + 底图修改时间，作为缓存键的一部分"""
+    mtime = int(os.path.getmtime(BG_PATH)) if os.path.exists(BG_PATH) else 0
+    return f"{LAYOUT_VERSION}.{mtime}"
+
+
+def render_poster(user_id: int, username: str, base_url: str) -> bytes:
+    """纯 CPU 渲染，在渲染进程池中执行"""
+    tpl = _load_template()
+    img = tpl["bg"].copy()
+    font = tpl["font"]
+    draw = ImageDraw.Draw(img)
+
+    # 2. 生成二维码
+    invite_url = f"{base_url}/register?invite={user_id}"
+    qr = qrcode.QRCode(box_size=10, border=2)
+    qr.add_data(invite_url)
+    qr.make(fit=True)
+    qr_img = qr.make_image(fill_color="black", back_color="white").resize((200, 200))
+
+    # 3. 粘贴二维码 (放在底部中间)
+    img_w, img_h = img.size
+    qr_x = (img_w - 200) // 2
+    qr_y = img_h - 300
+    img.paste(qr_img, (qr_x, qr_y))
+
+    # 4. 绘制文字 (昵称)
+    text = f"我是 {username}"
+    # 获取文字宽高 (兼容性写法)
+    try:
+        bbox = draw.textbbox((0, 0), text, font=font)
+        text_w = bbox[2] - bbox[0]
+    except Exception:
+        text_w = len(text) * 20 # 估算
+
+    draw.text(((img_w - text_w) // 2, qr_y - 60), text, fill="white", font=font)
+    draw.text(((img_w - 300) // 2, qr_y + 210), "扫码加入 红白悬赏", fill="white", font=font)
+
+    # 5. 输出
+    output = BytesIO()
+    img.save(output, format='JPEG', quality=85)
+    return output.getvalue()
+
+
+class PosterService:
+    """
+    邀请海报
+    - 渲染结果按 (user_id, 昵称, 站点地址, 版式版本) 缓存到磁盘，重复下载直接读文件
+    - 未命中时在独立进程池中渲染，不占用 API worker；底图和字体在渲染进程里只加载一次
+    """
+    _pool: Optional[ProcessPoolExecutor] = None
+
+    @staticmethod
+    def _executor() -> ProcessPoolExecutor:
+        if PosterService._pool is None:
+            PosterService._pool = ProcessPoolExecutor(max_workers=settings.POSTER_WORKERS, initializer=_load_template)
+        return PosterService._pool
+
+    @staticmethod
+    def cache_path(user_id: int, username: str, base_url: str) -> str:
+        key = f"{user_id}|{username}|{base_url}|{template_version()}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(CACHE_DIR, str(user_id % 256), f"{user_id}_{digest[:16]}.jpg")
+
+    @staticmethod
+    def _read(path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        """先写临时文件再原子替换，并发渲染同一张海报也不会读到半个文件；同时清掉该用户的旧海报"""
+        folder, name = os.path.split(path)
+        prefix = name.split("_", 1)[0] + "_"
         try:
-            bbox = draw.textbbox((0, 0), text, font=font)
-            text_w = bbox[2] - bbox[0]
-        except:
-            text_w = len(text) * 20 # 估算
-            
-        draw.text(((img_w - text_w) // 2, qr_y - 60), text, fill="white", font=font)
-        draw.text(((img_w - 300) // 2, qr_y + 210), "扫码加入 红白悬赏", fill="white", font=font)
-
-        # 5. 输出
-        output = BytesIO()
-        img.save(output, format='JPEG', quality=85)
-        return output.getvalue()
\ No newline at end of file
+            os.makedirs(folder, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            for old in os.listdir(folder):
+                if old.startswith(prefix) and old.endswith(".jpg") and old != name:
+                    os.remove(os.path.join(folder, old))
+        except OSError as e:
+            logger.warning(f"Poster cache write failed: {e}")
+
+    @staticmethod
+    async def get_poster(user_id: int, username: str, base_url: str) -> bytes:
+        path = PosterService.cache_path(user_id, username, base_url)
+        data = await asyncio.to_thread(PosterService._read, path)
+        if data is not None:
+            return data
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(PosterService._executor(), render_poster, user_id, username, base_url)
+        await asyncio.to_thread(PosterService._write, path, data)
+        return data
+
+    @staticmethod
+    def generate_poster(user_id: int, username: str, base_url: str) -> bytes:
+        """同步调用 (脚本 / 后台任务)：同样先查磁盘缓存"""
+        path = PosterService.cache_path(user_id, username, base_url)
+        data = PosterService._read(path)
+        if data is None:
+            data = render_poster(user_id, username, base_url)
+            PosterService._write(path, data)
+        return data
+
+    @staticmethod
+    def shutdown():
+        if PosterService._pool is not None:
+            PosterService._pool.shutdown(wait=False)
+            PosterService._pool = None
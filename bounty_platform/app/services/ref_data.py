@@ -0,0 +1,177 @@
+import asyncio
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app import models
+from app.database import redis_conn, redis_sync, on_commit
+from app.core.logger import logger
+
+DEFAULT_ANNOUNCEMENT = "欢迎来到红白悬赏 V3.0"
+DEFAULT_COMMISSION_RATE = 0.1
+# 参考数据里用到的系统配置项
+CONFIG_KEYS = ("announcement", "popup_content", "pay_qrcode", "commission_rate")
+
+
+class BannerRef(NamedTuple):
+    id: int
+    image_path: str
+    link_url: Optional[str]
+
+
+class CategoryRef(NamedTuple):
+    id: int
+    name: str
+    code: str
+    icon: str
+    color: str
+    sort_order: int
+
+
+class VipPlanRef(NamedTuple):
+    id: int
+    name: str
+    days: int
+    price: float
+    bonus_rate: int
+
+
+class RefSnapshot(NamedTuple):
+    """一次加载的只读快照 (模板里按属性访问，和 ORM 对象用法一致)"""
+    configs: Dict[str, str]
+    banners: Tuple[BannerRef, ...]
+    categories: Tuple[CategoryRef, ...]
+    vip_plans: Tuple[VipPlanRef, ...]
+    loaded_at: float
+
+    @property
+    def announcement(self) -> str:
+        return self.configs.get("announcement") or DEFAULT_ANNOUNCEMENT
+
+    @property
+    def popup_content(self) -> str:
+        return self.configs.get("popup_content") or ""
+
+    @property
+    def pay_qrcode(self) -> str:
+        return self.configs.get("pay_qrcode") or ""
+
+    @property
+    def commission_rate(self) -> float:
+        """后台按百分比配置，未配置或格式不对时用默认值"""
+        try:
+            return float(self.configs["commission_rate"]) / 100
+        except (KeyError, TypeError, ValueError):
+            return DEFAULT_COMMISSION_RATE
+
+
+class RefData:
+    """
+    参考数据缓存：系统配置 / Banner / 任务分类 / VIP 套餐，每个 worker 进程只加载一次
+    - 后台修改后调用 invalidate，事务提交后清空本进程并 PUBLISH 到 refdata:invalidate
+    - 每个 uvicorn worker 启动时运行 listen 订阅该频道，收到消息即清空，下次读取时重新加载
+    - 订阅断开期间 (以及没有订阅的 Celery / 脚本进程) 快照只保留 DETACHED_TTL 秒，不会长期读到旧数据
+    """
+    CHANNEL = "refdata:invalidate"
+    LISTENING_TTL = 3600
+    DETACHED_TTL = 5
+
+    _snapshot: Optional[RefSnapshot] = None
+    _generation = 0      # 每次失效 +1，加载期间发生失效时本次结果不入缓存
+    _listening = False
+
+    # ---------- 加载 (同步 / 异步 Session 共用语句) ----------
+    @staticmethod
+    def _statements():
+        return (
+            select(models.SystemConfig).where(models.SystemConfig.key.in_(CONFIG_KEYS)),
+            select(models.Banner).order_by(models.Banner.id),
+            select(models.TaskCategory).order_by(models.TaskCategory.sort_order, models.TaskCategory.id),
+            select(models.VipPlan).order_by(models.VipPlan.id),
+        )
+
+    @staticmethod
+    def _build(configs, banners, categories, plans) -> RefSnapshot:
+        return RefSnapshot(
+            configs={c.key: c.value for c in configs},
+            banners=tuple(BannerRef(b.id, b.image_path, b.link_url) for b in banners),
+            categories=tuple(CategoryRef(c.id, c.name, c.code, c.icon, c.color, c.sort_order) for c in categories),
+            vip_plans=tuple(VipPlanRef(p.id, p.name, p.days, p.price, p.bonus_rate) for p in plans),
+            loaded_at=time.monotonic(),
+        )
+
+    @staticmethod
+    def _cached() -> Optional[RefSnapshot]:
+        snap = RefData._snapshot
+        ttl = RefData.LISTENING_TTL if RefData._listening else RefData.DETACHED_TTL
+        if snap is not None and time.monotonic() - snap.loaded_at < ttl:
+            return snap
+        return None
+
+    @staticmethod
+    def _store(snap: RefSnapshot, generation: int) -> RefSnapshot:
+        if generation == RefData._generation:
+            RefData._snapshot = snap
+        return snap
+
+    @staticmethod
+    def get(db: Session) -> RefSnapshot:
+        snap = RefData._cached()
+        if snap is not None:
+            return snap
+        generation = RefData._generation
+        return RefData._store(RefData._build(*(db.execute(stmt).scalars().all() for stmt in RefData._statements())), generation)
+
+    @staticmethod
+    async def aget(db: AsyncSession) -> RefSnapshot:
+        snap = RefData._cached()
+        if snap is not None:
+            return snap
+        generation = RefData._generation
+        results = [(await db.execute(stmt)).scalars().all() for stmt in RefData._statements()]
+        return RefData._store(RefData._build(*results), generation)
+
+    # ---------- 失效 ----------
+    @staticmethod
+    def clear_local():
+        RefData._generation += 1
+        RefData._snapshot = None
+
+    @staticmethod
+    def _publish():
+        RefData.clear_local()
+        try:
+            redis_sync.publish(RefData.CHANNEL, "1")
+        except Exception as e:
+            logger.warning(f"Ref data invalidate publish failed: {e}")
+
+    @staticmethod
+    def invalidate(db):
+        """系统配置 / Banner / 任务分类 / VIP 套餐写入后调用，事务提交后生效"""
+        on_commit(db, RefData._publish)
+
+    # ---------- 订阅 (每个 worker 一个后台协程) ----------
+    @staticmethod
+    async def listen():
+        while True:
+            pubsub = redis_conn.pubsub()
+            try:
+                await pubsub.subscribe(RefData.CHANNEL)
+                # 断线期间可能错过消息，(重新) 订阅成功后先清一次
+                RefData.clear_local()
+                RefData._listening = True
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        RefData.clear_local()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Ref data subscriber disconnected: {e}")
+            finally:
+                RefData._listening = False
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+            await asyncio.sleep(1)
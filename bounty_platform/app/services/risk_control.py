@@ -1,9 +1,13 @@
 import hashlib
 import os
-import shutil
 import uuid
+from typing import BinaryIO, Optional, Tuple
 from fastapi import UploadFile
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.database import on_commit
+from app.services.phash_index import phash_index, dhash
 
 class RiskControlService:
     @staticmethod
@@ -16,31 +20,87 @@ class RiskControlService:
         return hash_md5.hexdigest()
 
     @staticmethod
-    def is_duplicate_image(db: Session, md5_hash: str) -> bool:
+    def duplicate_stmt(md5_hash: str):
+        """MD5 精确查重语句 (同步 / 异步 Session 共用)"""
         from app.models import Submission
-        exists = db.query(Submission).filter(
+        return select(Submission.id).where(
             Submission.image_hash == md5_hash,
-            Submission.status != "rejected" 
+            Submission.status != "rejected"
+        ).limit(1)
+
+    @staticmethod
+    def is_duplicate_image(db: Session, md5_hash: str) -> bool:
+        return db.execute(RiskControlService.duplicate_stmt(md5_hash)).first() is not None
+
+    # 🟢 近似查重：感知哈希 + 内存多索引，能识别重新压缩 / 缩放 / 轻微改动过的截图
+    @staticmethod
+    def calculate_phash(file_path: str) -> Optional[str]:
+        value = dhash(file_path)
+        return f"{value:016x}" if value is not None else None
+
+    @staticmethod
+    def find_similar_image(db: Session, phash: str, exclude_submission_id: Optional[int] = None, max_distance: Optional[int] = None) -> Optional[int]:
+        """返回一个与之相似且未被驳回的 submission id，没有则返回 None"""
+        from app.models import Submission
+        if max_distance is None:
+            max_distance = settings.PHASH_MAX_DISTANCE
+        candidates = [sid for sid in phash_index.search(db, int(phash, 16), max_distance) if sid != exclude_submission_id]
+        if not candidates:
+            return None
+        hit = db.query(Submission.id).filter(
+            Submission.id.in_(candidates),
+            Submission.status != "rejected"
         ).first()
-        return exists is not None
+        return hit.id if hit else None
 
-# 辅助函数：同步保存文件
-def save_upload_file_sync(file: UploadFile, folder: str = "app/static/uploads") -> str:
+    @staticmethod
+    def record_fingerprint(db: Session, submission_id: int, phash: str):
+        """写入指纹 (随调用方事务提交)，返回指纹对象；提交成功后自动加入本 worker 的内存索引，回滚则丢弃"""
+        from app.models import ImageFingerprint
+        fp = ImageFingerprint(submission_id=submission_id, phash=phash)
+        db.add(fp)
+        db.flush()
+        fp_id, h = fp.id, int(phash, 16)
+        on_commit(db, lambda: phash_index.add(fp_id, submission_id, h))
+        return fp
+
+# 辅助函数：单次流式写盘 + 同步计算 MD5，按内容寻址存储 (相同内容只存一份)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def save_upload_file_with_hash(file: UploadFile, folder: str = "app/static/uploads") -> Tuple[str, str]:
+    """
+    返回 (相对路径, md5)，失败返回 ("", "")
+    存储路径：uploads/ab/cd/<md5>.<ext>，两级分片避免单目录文件过多
+    """
+    return save_stream_with_hash(file.file, file.filename, folder)
+
+def save_stream_with_hash(stream: BinaryIO, filename: Optional[str], folder: str = "app/static/uploads") -> Tuple[str, str]:
+    """任意可读文件对象 (上传文件 / ZIP 成员) 的内容寻址写盘，可在多个线程中并发调用"""
+    ext = os.path.splitext(filename or "")[1].lower()[:10] or ".jpg"
     os.makedirs(folder, exist_ok=True)
-    filename = file.filename or f"{uuid.uuid4()}.jpg"
-    file_path = os.path.join(folder, filename)
-    
-    # 避免文件名冲突
-    if os.path.exists(file_path):
-        filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(folder, filename)
-    
+    tmp_path = os.path.join(folder, f".tmp_{uuid.uuid4().hex}")
+    hash_md5 = hashlib.md5()
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        with open(tmp_path, "wb") as buffer:
+            for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b""):
+                hash_md5.update(chunk)
+                buffer.write(chunk)
+        md5_val = hash_md5.hexdigest()
+        shard_dir = os.path.join(folder, md5_val[:2], md5_val[2:4])
+        os.makedirs(shard_dir, exist_ok=True)
+        file_path = os.path.join(shard_dir, f"{md5_val}{ext}")
+        if os.path.exists(file_path):
+            os.remove(tmp_path)  # 内容已存在，直接复用
+        else:
+            os.replace(tmp_path, file_path)
     except Exception as e:
         print(f"❌ Upload Failed: {e}")
-        return ""
-        
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        return "", ""
+
     # 返回相对路径 (去除 app 前缀，前端直接用 /static/...)
-    return file_path.replace("app", "", 1)
\ No newline at end of file
+    return file_path.replace("app", "", 1), md5_val
+
+# 辅助函数：同步保存文件 (只需要路径的场景)
+def save_upload_file_sync(file: UploadFile, folder: str = "app/static/uploads") -> str:
+    return save_upload_file_with_hash(file, folder)[0]
@@ -0,0 +1,141 @@
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app import models
+from app.database import redis_sync, on_commit
+from app.core.logger import logger
+
+# Submission 状态 -> 看板计数字段
+SUBMISSION_COUNTERS = {"pending": "pending_audit", "appealing": "pending_appeal"}
+
+
+class StatsService:
+    """
+    看板计数器 + 按日汇总
+    - 实时计数放在 Redis 哈希 stats:counters，状态流转时 HINCRBY (事务提交后执行)
+    - 当日趋势放在 stats:day:<日期>，历史趋势由定时任务 rollup_day 写入 daily_stats 表
+    - 计数器缺失或需要校准时 reconcile 按数据库重算
+    """
+    COUNTERS_KEY = "stats:counters"
+    COUNTER_FIELDS = ("pending_audit", "pending_appeal", "users", "active_tasks", "pending_withdraw")
+    DAY_TTL = 3 * 86400
+
+    @staticmethod
+    def day_key(d: Optional[date] = None) -> str:
+        return f"stats:day:{(d or date.today()).isoformat()}"
+
+    # ---------- 增量更新 ----------
+    @staticmethod
+    def incr(db, field: str, n: int = 1):
+        on_commit(db, lambda: redis_sync.hincrby(StatsService.COUNTERS_KEY, field, n))
+
+    @staticmethod
+    def incr_daily(db, metric: str, n: float = 1):
+        def apply():
+            key = StatsService.day_key()
+            redis_sync.hincrbyfloat(key, metric, n)
+            redis_sync.expire(key, StatsService.DAY_TTL)
+        on_commit(db, apply)
+
+    @staticmethod
+    def submission_status_changed(db, old: Optional[str], new: str, n: int = 1):
+        """Submission 新建 (old 为 None) 或状态变化时调用；批量审核按原状态分组传入数量 n"""
+        if old == new or n <= 0:
+            return
+        if old in SUBMISSION_COUNTERS:
+            StatsService.incr(db, SUBMISSION_COUNTERS[old], -n)
+        if new in SUBMISSION_COUNTERS:
+            StatsService.incr(db, SUBMISSION_COUNTERS[new], n)
+        if old is None:
+            StatsService.incr_daily(db, "submissions", n)
+        if new == "approved":
+            StatsService.incr_daily(db, "approved", n)
+
+    # ---------- 校准 ----------
+    @staticmethod
+    def count_from_db(db: Session) -> dict:
+        return {
+            "pending_audit": db.query(models.Submission).filter(models.Submission.status == "pending").count(),
+            "pending_appeal": db.query(models.Submission).filter(models.Submission.status == "appealing").count(),
+            "users": db.query(models.User).count(),
+            "active_tasks": db.query(models.Task).filter(models.Task.is_active == True).count(),
+            "pending_withdraw": db.query(models.Withdrawal).filter(models.Withdrawal.status == "pending").count(),
+        }
+
+    @staticmethod
+    def reconcile(db: Session) -> dict:
+        counters = StatsService.count_from_db(db)
+        redis_sync.hset(StatsService.COUNTERS_KEY, mapping=counters)
+        return counters
+
+    # ---------- 读取 ----------
+    @staticmethod
+    def get_counters(db: Session) -> dict:
+        try:
+            raw = redis_sync.hgetall(StatsService.COUNTERS_KEY)
+            if all(f in raw for f in StatsService.COUNTER_FIELDS):
+                return {f: int(raw[f]) for f in StatsService.COUNTER_FIELDS}
+            return StatsService.reconcile(db)
+        except Exception as e:
+            logger.warning(f"Stats counters unavailable, falling back to COUNT: {e}")
+            return StatsService.count_from_db(db)
+
+    @staticmethod
+    def get_trend(db: Session, days: int = 90) -> dict:
+        """最近 N 天趋势：历史取 daily_stats，今天取 Redis 当日计数"""
+        today = date.today()
+        start = (today - timedelta(days=days - 1)).isoformat()
+        rows = {r.date: r for r in db.query(models.DailyStat).filter(models.DailyStat.date >= start).all()}
+        try:
+            live = redis_sync.hgetall(StatsService.day_key(today))
+        except Exception:
+            live = {}
+
+        trend = {"dates": [], "users": [], "subs": [], "money": []}
+        for i in range(days):
+            d = (today - timedelta(days=days - 1 - i)).isoformat()
+            if d == today.isoformat():
+                users, subs, money = int(float(live.get("new_users", 0))), int(float(live.get("submissions", 0))), float(live.get("payout", 0))
+            else:
+                r = rows.get(d)
+                users, subs, money = (r.new_users, r.submissions, r.payout) if r else (0, 0, 0.0)
+            trend["dates"].append(d[5:])
+            trend["users"].append(users)
+            trend["subs"].append(subs)
+            trend["money"].append(round(money, 2))
+        return trend
+
+    # ---------- 按日汇总 (定时任务) ----------
+    @staticmethod
+    def rollup_day(db: Session, d: date) -> models.DailyStat:
+        """按数据库重算某一天的汇总 (可重复执行)"""
+        begin = datetime.combine(d, datetime.min.time())
+        end = begin + timedelta(days=1)
+
+        def ledger_sum(biz_types):
+            return db.query(func.coalesce(func.sum(models.LedgerEntry.amount), 0)).filter(
+                models.LedgerEntry.biz_type.in_(biz_types),
+                models.LedgerEntry.created_at >= begin, models.LedgerEntry.created_at < end
+            ).scalar()
+
+        stat = db.get(models.DailyStat, d.isoformat()) or models.DailyStat(date=d.isoformat())
+        stat.new_users = db.query(models.User).filter(models.User.created_at >= begin, models.User.created_at < end).count()
+        stat.submissions = db.query(models.Submission).filter(models.Submission.created_at >= begin, models.Submission.created_at < end).count()
+        stat.approved = db.query(models.LedgerEntry).filter(
+            models.LedgerEntry.biz_type == "task_reward",
+            models.LedgerEntry.created_at >= begin, models.LedgerEntry.created_at < end
+        ).count()
+        stat.payout = ledger_sum(["task_reward", "commission"])
+        stat.deposit = ledger_sum(["deposit"])
+        stat.withdraw = -ledger_sum(["withdraw"]) - ledger_sum(["withdraw_refund"])
+        db.merge(stat)
+        db.commit()
+        return stat
+
+    @staticmethod
+    def rollup_recent(db: Session, days: int = 2):
+        """汇总最近 N 天 (含今天)，定时任务每小时执行一次即可"""
+        today = date.today()
+        for i in range(days):
+            StatsService.rollup_day(db, today - timedelta(days=i))
@@ -0,0 +1,94 @@
+from typing import Iterable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app import models
+from app.core.user_cache import UserCache
+
+# 无门槛任务在倒排索引中的通配标签
+ALL_TAG = "*"
+
+
+class TagIndexService:
+    """
+    定向投放倒排索引
+    - task_tags 只保存上架中的任务：上架写入，下架删除
+    - 无 required_tags 的任务写一行通配标签，查询时与用户标签一起 IN 查询
+    - 这样可见任务查询只扫描命中的索引行，成本与可见任务数相关，与任务总数无关
+    """
+
+    # ---------- 任务侧 ----------
+    @staticmethod
+    def index_task(db: Session, task: models.Task):
+        """任务发布 / 修改 / 上架后调用 (不 commit，随调用方事务提交)"""
+        db.query(models.TaskTag).filter(models.TaskTag.task_id == task.id).delete(synchronize_session=False)
+        if not task.is_active:
+            return
+        tags = set(task.required_tags or []) or {ALL_TAG}
+        db.add_all([models.TaskTag(task_id=task.id, tag=tag, category=task.category) for tag in tags])
+
+    @staticmethod
+    def remove_task(db: Session, task_id: int):
+        """任务下架后调用"""
+        db.query(models.TaskTag).filter(models.TaskTag.task_id == task_id).delete(synchronize_session=False)
+
+    # ---------- 用户侧 ----------
+    @staticmethod
+    def set_user_tags(db: Session, user: models.User, tags: Iterable[str]):
+        """统一的打标签入口：同时更新 User.tags JSON 与 user_tags 索引"""
+        tags = sorted({t.strip() for t in tags if t and t.strip()})
+        user.tags = tags
+        UserCache.mark_dirty(db, user.id)
+        db.query(models.UserTag).filter(models.UserTag.user_id == user.id).delete(synchronize_session=False)
+        db.add_all([models.UserTag(user_id=user.id, tag=tag) for tag in tags])
+
+    @staticmethod
+    def get_user_tags(db: Session, user_id: int) -> List[str]:
+        rows = db.query(models.UserTag.tag).filter(models.UserTag.user_id == user_id).all()
+        return [r.tag for r in rows]
+
+    # ---------- 查询 ----------
+    @staticmethod
+    def visible_tasks_stmt(user_tags: Optional[Iterable[str]], cat: str = "all"):
+        """可见任务查询语句 (同步 / 异步 Session 共用)"""
+        tags = list(set(user_tags or [])) + [ALL_TAG]
+        sub = select(models.TaskTag.task_id).where(models.TaskTag.tag.in_(tags))
+        if cat != "all":
+            sub = sub.where(models.TaskTag.category == cat)
+        return select(models.Task).where(
+            models.Task.id.in_(sub),
+            models.Task.is_active == True
+        ).order_by(models.Task.created_at.desc())
+
+    @staticmethod
+    def visible_tasks_for_tags(db: Session, user_tags: Optional[Iterable[str]], cat: str = "all") -> List[models.Task]:
+        """给定标签集合，返回该分类下可见的上架任务 (按发布时间倒序)"""
+        return db.execute(TagIndexService.visible_tasks_stmt(user_tags, cat)).scalars().all()
+
+    @staticmethod
+    def visible_tasks(db: Session, user_id: Optional[int], cat: str = "all") -> List[models.Task]:
+        """用户 U 在分类 C 下可见的任务；user_id 为空视为游客"""
+        tags = TagIndexService.get_user_tags(db, user_id) if user_id else []
+        return TagIndexService.visible_tasks_for_tags(db, tags, cat)
+
+    # ---------- 全量重建 ----------
+    @staticmethod
+    def rebuild(db: Session):
+        """根据 tasks.required_tags / users.tags 全量重建索引 (首次上线或数据修复时执行)"""
+        db.query(models.TaskTag).delete(synchronize_session=False)
+        db.query(models.UserTag).delete(synchronize_session=False)
+        for task in db.query(models.Task).filter(models.Task.is_active == True).yield_per(500):
+            tags = set(task.required_tags or []) or {ALL_TAG}
+            db.add_all([models.TaskTag(task_id=task.id, tag=tag, category=task.category) for tag in tags])
+        for user in db.query(models.User).filter(models.User.tags.isnot(None)).yield_per(500):
+            db.add_all([models.UserTag(user_id=user.id, tag=tag) for tag in set(user.tags or [])])
+        db.commit()
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    session = SessionLocal()
+    try:
+        TagIndexService.rebuild(session)
+        print("✅ Tag index rebuilt")
+    finally:
+        session.close()
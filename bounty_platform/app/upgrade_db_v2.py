@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.schedules import crontab
 from .core.config import settings
 
 celery = Celery(
@@ -13,6 +14,13 @@ celery.conf.update(
     result_serializer="json",
     timezone="Asia/Shanghai",
     enable_utc=True,
+    # 🟢 定时任务 (celery -A app.upgrade_db_v2.celery beat)
+    beat_schedule={
+        "rollup-daily-stats": {"task": "app.upgrade_db_v2.rollup_daily_stats", "schedule": crontab(minute=5)},
+        "reconcile-stats-counters": {"task": "app.upgrade_db_v2.reconcile_stats_counters", "schedule": crontab(minute=30, hour=4)},
+        "drain-outbox": {"task": "app.upgrade_db_v2.drain_outbox", "schedule": crontab()},
+        "reconcile-material-pools": {"task": "app.upgrade_db_v2.reconcile_material_pools", "schedule": crontab(minute="*/10")},
+    },
 )
 
 # 示例异步任务
@@ -20,4 +28,58 @@ celery.conf.update(
 def async_send_email(email: str, subject: str, content: str):
     import time
     time.sleep(2) # 模拟耗时
-    print(f"📧 [模拟邮件] 发送给 {email}: {subject}")
\ No newline at end of file
+    print(f"📧 [模拟邮件] 发送给 {email}: {subject}")
+
+# 🟢 看板按日汇总：每小时重算 今天 + 昨天
+@celery.task
+def rollup_daily_stats(days: int = 2):
+    from .database import SessionLocal
+    from .services.stats_service import StatsService
+    db = SessionLocal()
+    try:
+        StatsService.rollup_recent(db, days)
+    finally:
+        db.close()
+
+# 🟢 看板计数器每日与数据库对账一次，消除漂移
+@celery.task
+def reconcile_stats_counters():
+    from .database import SessionLocal
+    from .services.stats_service import StatsService
+    db = SessionLocal()
+    try:
+        return StatsService.reconcile(db)
+    finally:
+        db.close()
+
+# 🟢 素材库存池对账：提交后 push 到 Redis 失败的新素材 / 释放的素材在这里补回池子
+@celery.task
+def reconcile_material_pools():
+    from .database import SessionLocal
+    from .services.material_pool import MaterialPool
+    db = SessionLocal()
+    try:
+        return MaterialPool.reconcile_all(db)
+    finally:
+        db.close()
+
+# 🟢 分群群发：分块写信，没发完就重新入队 (断点保存在 broadcasts.last_user_id)
+@celery.task(bind=True, max_retries=5, default_retry_delay=30)
+def fanout_broadcast(self, broadcast_id: int):
+    from .database import SessionLocal
+    from .services.broadcast_service import BroadcastService
+    db = SessionLocal()
+    try:
+        if not BroadcastService.run(db, broadcast_id):
+            fanout_broadcast.delay(broadcast_id)
+    except Exception as e:
+        db.rollback()
+        raise self.retry(exc=e)
+    finally:
+        db.close()
+
+# 🟢 发件箱消费：业务事务提交后触发；beat 每分钟兜底 (错过的触发 / 到期的重试)
+@celery.task
+def drain_outbox():
+    from .services.jobs import JobQueue
+    return JobQueue.drain()
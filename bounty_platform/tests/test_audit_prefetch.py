@@ -0,0 +1,52 @@
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app import models
+from app.database import Base
+from app.services.audit_service import AuditService
+
+PAGE_SIZE = 15
+
+
+@contextmanager
+def count_queries(bind):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, "before_cursor_execute", before_cursor_execute)
+
+
+def test_audit_page_loads_in_fixed_number_of_queries():
+    bind = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=bind)
+    db = sessionmaker(bind=bind, autoflush=False)()
+
+    db.add(models.MaterialCategory(id=1, name="素材"))
+    for i in range(1, PAGE_SIZE + 1):
+        db.add(models.User(id=i, username=f"u{i}"))
+        db.add(models.Task(id=i, title=f"任务{i}", price=1.5, price_mode="fixed", material_category_id=1))
+        db.add(models.Material(id=i, category_id=1, title=f"m{i}", images=[f"/static/m{i}.jpg"], status="locked"))
+        db.add(models.Submission(id=i, user_id=i, task_id=i, assigned_material_id=i, status="pending", screenshot_path=f"s{i}.jpg"))
+    db.commit()
+    db.expunge_all()
+
+    with count_queries(bind) as statements:
+        subs, total = AuditService.list_page(db, "pending", 1, PAGE_SIZE)
+        # 模板 admin/audit.html 读取的属性
+        rendered = [
+            (s.id, s.user.username, s.user_id, s.task.title, s.task.price, s.task.price_mode,
+             s.status, s.appeal_reason, s.appeal_img, s.screenshot_path, s.ref_images[0])
+            for s in subs
+        ]
+
+    assert total == PAGE_SIZE
+    assert len(rendered) == PAGE_SIZE
+    assert {r[-1] for r in rendered} == {f"/static/m{i}.jpg" for i in range(1, PAGE_SIZE + 1)}
+    assert len(statements) <= 3, statements
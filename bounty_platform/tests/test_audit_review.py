@@ -0,0 +1,61 @@
+from pytest import approx
+from app import models
+from app.services.audit_service import AuditService
+
+
+def _seed(db):
+    db.add_all([
+        models.User(id=1, username="inviter", balance=0.0),
+        models.User(id=2, username="alice", balance=0.0, inviter_id=1),
+        models.User(id=3, username="bob", balance=2.0, inviter_id=1),
+    ])
+    db.add_all([
+        models.Task(id=1, title="固定", price=10.0, price_mode="fixed"),
+        models.Task(id=2, title="固定2", price=5.0, price_mode="fixed"),
+        models.Task(id=3, title="动态", price=0.0, price_mode="dynamic"),
+    ])
+    db.add_all([
+        models.Submission(id=1, user_id=2, task_id=1, status="pending"),
+        models.Submission(id=2, user_id=2, task_id=2, status="appealing"),
+        models.Submission(id=3, user_id=3, task_id=3, status="pending"),
+        models.Submission(id=4, user_id=2, task_id=3, status="pending"),  # 动态定价未给金额
+    ])
+    db.commit()
+
+
+def _ledger(db, biz_type):
+    L = models.LedgerEntry
+    return [(e.user_id, e.amount, e.balance_after, e.ref_id)
+            for e in db.query(L).filter(L.biz_type == biz_type).order_by(L.id)]
+
+
+def test_batch_approve_credits_rewards_and_commission_once(db):
+    _seed(db)
+    result = AuditService.review(db, [1, 2, 3, 4], "approve", amounts={3: 8.0})
+    db.commit()  # JOBS_EAGER=1：提交后立即执行 submission_approved
+    assert result == {"approved": 3, "rejected": 0, "skipped": [4]}
+
+    db.expire_all()
+    assert db.get(models.User, 2).balance == 15.0
+    assert db.get(models.User, 3).balance == 10.0
+    assert db.get(models.User, 1).balance == approx(2.3)
+    assert _ledger(db, "task_reward") == [(2, 10.0, 10.0, 1), (2, 5.0, 15.0, 2), (3, 8.0, 10.0, 3)]
+    commissions = _ledger(db, "commission")
+    assert [(uid, ref) for uid, _, _, ref in commissions] == [(1, 1), (1, 2), (1, 3)]
+    assert [a for _, a, _, _ in commissions] == approx([1.0, 0.5, 0.8])
+    assert [b for _, _, b, _ in commissions] == approx([1.0, 1.5, 2.3])
+    assert {s.id: (s.status, s.final_amount) for s in db.query(models.Submission)} == {
+        1: ("approved", 10.0), 2: ("approved", 5.0), 3: ("approved", 8.0), 4: ("pending", 0.0),
+    }
+    assert db.get(models.UserStats, 2).approved_count == 2
+    assert db.get(models.UserStats, 3).approved_count == 1
+
+    # 重复审核：已结算的提交全部跳过，余额 / 流水 / 计数不变
+    again = AuditService.review(db, [1, 2, 3], "approve", amounts={3: 8.0})
+    db.commit()
+    assert again == {"approved": 0, "rejected": 0, "skipped": [1, 2, 3]}
+    db.expire_all()
+    assert (db.get(models.User, 2).balance, db.get(models.User, 3).balance) == (15.0, 10.0)
+    assert db.get(models.User, 1).balance == approx(2.3)
+    assert len(_ledger(db, "task_reward")) == 3 and len(_ledger(db, "commission")) == 3
+    assert db.get(models.UserStats, 2).approved_count == 2
@@ -0,0 +1,57 @@
+import gzip
+import json
+from sqlalchemy import create_engine, select
+from app import models
+from app.services.backup_service import BackupService, STATE_PATH
+
+
+def _rows(bind, table):
+    with bind.connect() as conn:
+        return [tuple(r) for r in conn.execute(select(table).order_by(*table.primary_key.columns))]
+
+
+def _table_modes(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return {item["table"]: item["mode"] for item in map(json.loads, f) if "table" in item}
+
+
+def test_full_plus_incremental_restore_matches_source(db, tmp_path):
+    db.add_all([models.User(id=1, username="a", balance=10.0), models.User(id=2, username="b", balance=0.0)])
+    db.add(models.Task(id=1, title="t", price=5.0))
+    db.add_all([models.Submission(id=1, user_id=1, task_id=1, status="pending"),
+                models.Submission(id=2, user_id=2, task_id=1, status="pending")])
+    db.add(models.LedgerEntry(id=1, user_id=1, type="income", biz_type="deposit", title="充值", amount=10.0, balance_after=10.0))
+    db.commit()
+    full = BackupService.backup_to_file(str(tmp_path / "full.jsonl.gz"))
+
+    # 备份之后：改余额 / 审核结果、删除一条提交、追加一条流水
+    db.get(models.User, 1).balance = 15.0
+    db.get(models.Submission, 1).status, db.get(models.Submission, 1).final_amount = "approved", 5.0
+    db.delete(db.get(models.Submission, 2))
+    db.add(models.LedgerEntry(id=2, user_id=1, type="income", biz_type="task_reward", title="任务奖励", amount=5.0, balance_after=15.0))
+    db.commit()
+    inc = BackupService.backup_to_file(str(tmp_path / "inc.jsonl.gz"), incremental=True)
+
+    modes = _table_modes(inc)
+    assert modes["ledger_entries"] == "append"
+    assert modes["users"] == modes["submissions"] == "full"
+
+    target = create_engine(f"sqlite:///{tmp_path / 'restored.db'}")
+    BackupService.restore(full, target)
+    BackupService.restore(inc, target)
+    for table in (models.User.__table__, models.Submission.__table__, models.LedgerEntry.__table__):
+        assert _rows(target, table) == _rows(db.get_bind(), table)
+
+
+def test_http_download_does_not_move_watermark(db, tmp_path):
+    db.add(models.User(id=1, username="a"))
+    db.commit()
+    BackupService.backup_to_file(str(tmp_path / "full.jsonl.gz"))
+    with open(STATE_PATH, encoding="utf-8") as f:
+        before = f.read()
+
+    db.add(models.User(id=2, username="b"))
+    db.commit()
+    b"".join(BackupService.iter_backup(incremental=True, save_state=False))
+    with open(STATE_PATH, encoding="utf-8") as f:
+        assert f.read() == before
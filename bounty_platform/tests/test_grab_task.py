@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+from app import models
+from app.database import AsyncSessionLocal
+from app.routers import h5
+from app.services import material_pool
+from app.services.material_pool import MaterialPool
+
+
+class FakeRedis:
+    """抢单用到的几个 Redis 命令的进程内实现"""
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def exists(self, key):
+        return int(key in self.data)
+
+    async def lpop(self, key):
+        items = self.data.get(key) or []
+        return items.pop(0) if items else None
+
+    async def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(str(v) for v in values)
+
+
+def test_commit_failure_returns_claimed_material_to_pool(db, monkeypatch):
+    db.add(models.MaterialCategory(id=1, name="素材", total_count=1))
+    db.add(models.Material(id=7, category_id=1, title="m", status="unused", is_deleted=False))
+    db.add(models.Task(id=1, title="任务", price=1.0, material_category_id=1))
+    db.commit()
+
+    fake = FakeRedis()
+    fake.data[MaterialPool.pool_key(1)] = ["7"]
+    fake.data[MaterialPool.loaded_key(1)] = "1"
+    monkeypatch.setattr(h5, "redis_conn", fake)
+    monkeypatch.setattr(material_pool, "redis_conn", fake)
+
+    async def failing_commit(session):
+        raise RuntimeError("commit failed")
+    monkeypatch.setattr(h5, "commit_async", failing_commit)
+
+    async def run():
+        async with AsyncSessionLocal() as adb:
+            return await h5.grab_task(1, db=adb, user=SimpleNamespace(id=1))
+    resp = asyncio.run(run())
+
+    assert resp.body.decode() == "抢单失败，请重试"
+    assert fake.data[MaterialPool.pool_key(1)] == ["7"]
+    db.expire_all()
+    assert db.get(models.Material, 7).status == "unused"
+    assert db.query(models.Submission).count() == 0
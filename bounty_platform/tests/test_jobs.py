@@ -0,0 +1,54 @@
+from datetime import datetime
+from app import models
+from app.services.audit_service import AuditService
+from app.services.jobs import JobQueue, _HANDLERS
+
+
+def _seed(db):
+    db.add_all([
+        models.User(id=1, username="inviter", balance=0.0),
+        models.User(id=2, username="worker", balance=0.0, inviter_id=1),
+    ])
+    db.add(models.Task(id=1, title="任务", price=10.0, price_mode="fixed"))
+    db.add(models.Submission(id=1, user_id=2, task_id=1, status="pending"))
+    db.commit()
+
+
+def _commissions(db):
+    return db.query(models.LedgerEntry).filter(models.LedgerEntry.biz_type == "commission").all()
+
+
+def test_approval_runs_follow_up_job_eagerly_after_commit(db):
+    _seed(db)
+    AuditService.review(db, [1], "approve")
+    db.commit()  # JOBS_EAGER=1：提交后在当前进程立即执行发件箱任务
+
+    db.expire_all()
+    job = db.query(models.OutboxJob).one()
+    assert (job.kind, job.status) == ("submission_approved", "done")
+    assert db.get(models.User, 2).balance == 10.0
+    assert db.get(models.User, 1).balance == 1.0
+    assert [(c.user_id, c.amount, c.ref_id) for c in _commissions(db)] == [(1, 1.0, 1)]
+    assert db.get(models.UserStats, 2).approved_count == 1
+
+    # 任务重复投递 (消费者崩溃后重跑) 不会重复发提成
+    _HANDLERS["submission_approved"](db, job.payload)
+    db.commit()
+    assert len(_commissions(db)) == 1
+
+
+def test_failed_job_is_retried_with_backoff_then_dead(db):
+    JobQueue.enqueue(db, "no_such_kind", {})
+    db.commit()
+
+    job = db.query(models.OutboxJob).one()
+    assert (job.status, job.attempts) == ("pending", 1)
+    assert job.next_run_at > datetime.now()
+    assert "unknown job kind" in job.last_error
+
+    for _ in range(JobQueue.MAX_ATTEMPTS - 1):
+        job.next_run_at = datetime.now()
+        db.commit()
+        JobQueue.drain()
+        db.expire_all()
+    assert (job.status, job.attempts) == ("dead", JobQueue.MAX_ATTEMPTS)
@@ -0,0 +1,27 @@
+from sqlalchemy import func
+from app import models
+from app.database import SessionLocal
+from app.services.ledger_service import LedgerService
+
+
+def test_change_balance_does_not_overwrite_concurrent_credit(db):
+    db.add(models.User(id=1, username="a", balance=10.0))
+    db.commit()
+
+    # 签到请求先加载了用户，期间批量审核在另一个事务里入账并提交
+    user = db.get(models.User, 1)
+    other = SessionLocal()
+    try:
+        LedgerService.credit_many(other, [{"user_id": 1, "amount": 5.0, "biz_type": "task_reward", "title": "任务奖励", "ref_id": 1}])
+        other.commit()
+    finally:
+        other.close()
+
+    LedgerService.change_balance(db, user, 0.5, "checkin", "每日签到奖励")
+    db.commit()
+
+    db.expire_all()
+    assert db.get(models.User, 1).balance == 15.5
+    entries = db.query(models.LedgerEntry).order_by(models.LedgerEntry.id).all()
+    assert [(e.amount, e.balance_after) for e in entries] == [(5.0, 15.0), (0.5, 15.5)]
+    assert 10.0 + db.query(func.sum(models.LedgerEntry.amount)).scalar() == db.get(models.User, 1).balance
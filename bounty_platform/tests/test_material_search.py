@@ -0,0 +1,40 @@
+import asyncio
+from app import models
+from app.database import AsyncSessionLocal
+from app.services.material_search import MaterialSearchService, tokenize
+
+
+def _search(keyword, cat_id=0):
+    async def run():
+        async with AsyncSessionLocal() as adb:
+            page = await MaterialSearchService.page(adb, cat_id, keyword, None, 20)
+            return sorted(m.title for m in page["items"])
+    return asyncio.run(run())
+
+
+def test_tokenize_bigrams_ascii_and_cjk():
+    assert tokenize("Python3教程") == {"py", "yt", "th", "ho", "on", "n3", "3教", "教程"}
+    assert tokenize("红 包") == {"红", "包"}
+
+
+def test_search_matches_substrings_like_the_old_like_filter(db):
+    db.add(models.MaterialCategory(id=1, name="素材", total_count=3))
+    mats = [
+        models.Material(id=1, category_id=1, title="Python3教程", content="入门", is_deleted=False),
+        models.Material(id=2, category_id=1, title="红包活动", content="", is_deleted=False),
+        models.Material(id=3, category_id=1, title="活动红", content="thought on", is_deleted=False),
+    ]
+    db.add_all(mats)
+    db.flush()
+    MaterialSearchService.index_materials(db, mats)
+    db.commit()
+
+    # "thought on" 里 th / ho / on 都有但不相邻，回表校验后不算命中
+    assert _search("thon") == ["Python3教程"]
+    assert _search("3教") == ["Python3教程"]
+    # 单字段交给 LIKE 校验
+    assert _search("红 活动") == ["活动红", "红包活动"]
+    assert _search("红包") == ["红包活动"]
+    assert _search("红") == ["活动红", "红包活动"]
+    assert _search("python thon") == ["Python3教程"]
+    assert _search("教程 红") == []
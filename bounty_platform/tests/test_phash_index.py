@@ -0,0 +1,58 @@
+from app import models
+from app.services.phash_index import PHashIndex
+
+H1, H2, H3 = 0x0123456789ABCDEF, 0xFEDCBA9876543210, 0x00FF00FF00FF00FF
+
+
+def _index(tmp_path):
+    index = PHashIndex()
+    index.SNAPSHOT_PATH = str(tmp_path / "phash_index.bin")
+    return index
+
+
+def _add(db, fp_id, sub_id, h):
+    db.add(models.ImageFingerprint(id=fp_id, submission_id=sub_id, phash=f"{h:016x}"))
+    db.commit()
+
+
+def test_fingerprint_committed_below_watermark_is_not_skipped(db, tmp_path):
+    index = _index(tmp_path)
+    _add(db, 1, 1, H1)
+    _add(db, 3, 3, H3)  # id 2 的事务还没提交
+    assert index.search(db, H3, 0) == [3]
+    assert index.watermark == 1
+
+    _add(db, 2, 2, H2)
+    assert index.search(db, H2, 0) == [2]
+    assert index.watermark == 3 and not index.pending
+
+
+def test_stale_gap_is_skipped(db, tmp_path):
+    index = _index(tmp_path)
+    _add(db, 1, 1, H1)
+    _add(db, 3, 3, H3)  # id 2 回滚，永远不会出现
+    index.sync(db)
+    assert index.watermark == 1
+
+    index.GAP_TIMEOUT = 0
+    index.sync(db)
+    assert index.watermark == 3 and not index.pending
+    assert index.search(db, H1, 0) == [1]
+
+
+def test_recorded_fingerprint_is_indexed_after_commit(db, tmp_path, monkeypatch):
+    from app.services import risk_control
+    index = _index(tmp_path)
+    index.loaded = True
+    monkeypatch.setattr(risk_control, "phash_index", index)
+
+    fp = risk_control.RiskControlService.record_fingerprint(db, 1, f"{H1:016x}")
+    assert not index.pending
+    db.commit()
+    assert index.pending.keys() == {fp.id}
+    assert index.search(db, H1, 0) == [1]
+    assert index.watermark == fp.id and not index.pending
+
+    risk_control.RiskControlService.record_fingerprint(db, 2, f"{H2:016x}")
+    db.rollback()
+    assert not index.pending